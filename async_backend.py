@@ -0,0 +1,234 @@
+"""Optional asyncio HTTP backend for the crawl, built on one pooled aiohttp session."""
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # aiohttp is an optional dependency
+    aiohttp = None
+
+from barcodes import take_slug_barcode
+from fetching import FetchStats
+from metrics import METRICS
+from parsing import parse_barcode, parse_listing_page
+from product_record import ProductRecord
+from rate_limiter import AdaptiveRateLimiter, HostRateLimiter, parse_retry_after
+
+# Statuses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _HostSlots:
+    """Requests in flight to one host; tasks beyond the adaptive concurrency wait on the condition."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+
+class AsyncFetcher:
+    """
+    Pooled aiohttp client carrying the headers and cookies of a logged-in requests.Session.
+
+    Use as an async context manager:
+
+        async with AsyncFetcher(session, max_connections_per_host=20) as fetcher:
+            html = await fetcher.fetch_text(url)
+    """
+
+    def __init__(self, session: requests.Session | None = None, max_connections: int = 100,
+                 max_connections_per_host: int = 10, timeout: float = 30.0, keepalive_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_base: float = 1.0,
+                 rate_limiter: HostRateLimiter | AdaptiveRateLimiter | None = None):
+        if aiohttp is None:
+            raise RuntimeError("The async backend needs aiohttp: pip install aiohttp")
+        self.session = session
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.rate_limiter = rate_limiter
+        self.stats = FetchStats()
+        self._client = None
+        self._host_slots: dict[str, _HostSlots] = {}
+        self._reserve_lock = None
+
+    async def __aenter__(self):
+        # One task at a time waits for the adaptive limiter's next rate slot
+        self._reserve_lock = asyncio.Lock()
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        headers = dict(self.session.headers) if self.session else None
+        self._client = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),  # also keep cookies for IP hosts such as a local test site
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        if self.session:
+            # Carry the authenticated cookies over from attempt_login
+            for cookie in self.session.cookies:
+                domain = cookie.domain.lstrip('.') or 'localhost'
+                self._client.cookie_jar.update_cookies({cookie.name: cookie.value},
+                                                       response_url=URL(f"http://{domain}/"))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.close()
+
+    def _retry_delay(self, attempt: int, retry_after: str | None = None) -> float:
+        """Exponential backoff with jitter, deferring to a Retry-After header."""
+        retry_seconds = parse_retry_after(retry_after)
+        if retry_seconds is not None:
+            return retry_seconds
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+
+    async def _wait_for_slot(self, url: str) -> float:
+        """Sleep until the rate limiter lets a request to url go, return the seconds waited."""
+        if not isinstance(self.rate_limiter, AdaptiveRateLimiter):
+            # A fixed rate never changes, so the slot can be booked up front
+            waited = self.rate_limiter.reserve(url)
+            if waited > 0:
+                await asyncio.sleep(waited)
+            return max(waited, 0.0)
+
+        started = time.monotonic()
+        # Tasks past the host's current concurrency sleep until a request finishes, instead of polling
+        slots = self._host_slots.setdefault(urlsplit(url).netloc, _HostSlots())
+        async with slots.condition:
+            await slots.condition.wait_for(lambda: slots.in_flight < self.rate_limiter.current_concurrency(url))
+            slots.in_flight += 1
+        # Ask again after every sleep: the adaptive rate may have changed meanwhile
+        async with self._reserve_lock:
+            slept = False
+            while (wait := self.rate_limiter.try_reserve(url, waited=slept)) > 0:
+                await asyncio.sleep(wait)
+                slept = True
+        return time.monotonic() - started
+
+    async def _release_slot(self, url: str):
+        """Let as many waiting tasks go as the host's concurrency, which may have grown, now allows."""
+        slots = self._host_slots[urlsplit(url).netloc]
+        async with slots.condition:
+            slots.in_flight -= 1
+            slots.condition.notify(max(1, self.rate_limiter.current_concurrency(url) - slots.in_flight))
+
+    async def fetch_text(self, url: str) -> str:
+        """GET a page and return its body, retrying 429/5xx responses and network errors."""
+        for attempt in range(self.max_retries + 1):
+            waited = 0.0
+            if self.rate_limiter:
+                waited = await self._wait_for_slot(url)
+                METRICS.observe('wait.rate_limit', waited)
+
+            started = time.monotonic()
+            try:
+                async with self._client.get(url) as response:
+                    if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+                        self.rate_limiter.record(url, time.monotonic() - started, response.status,
+                                                 response.headers.get('Retry-After'))
+                    if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                        delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+                        logging.warning(f"Got {response.status} from {url}, retrying in {delay:.1f}s")
+                        self.stats.record(time.monotonic() - started, False, waited)
+                        METRICS.inc('http.retries')
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    text = await response.text()
+                    elapsed = time.monotonic() - started
+                    self.stats.record(elapsed, True, waited)
+                    METRICS.observe('http.request', elapsed)
+                    METRICS.inc('http.requests')
+                    METRICS.inc('http.bytes', len(text))
+                    return text
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.stats.record(time.monotonic() - started, False, waited)
+                METRICS.inc('http.errors')
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logging.warning(f"Network error fetching {url} ({str(e) or type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            finally:
+                if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+                    await self._release_slot(url)
+
+
+async def async_scrape_single_barcode(fetcher: AsyncFetcher, product: dict):
+    """Fetch one product's detail page and store the barcode on the product dict."""
+    logging.debug(f"Scraping barcode for {product['name']} from {product['detail_url']}")
+    try:
+        barcode = parse_barcode(await fetcher.fetch_text(product['detail_url']))
+        if barcode:
+            product['barcode'] = barcode
+            logging.debug(f"Found barcode for {product['name']}: {barcode}")
+        else:
+            logging.warning(f"Barcode not found for {product['name']}")
+    except Exception as e:
+        logging.error(f"Error scraping barcode for {product['name']}: {str(e)}")
+
+
+async def async_scrape_products(fetcher: AsyncFetcher, start_url: str, max_pages: int = 999,
+                                use_slug_barcodes: bool = False) -> list[ProductRecord]:
+    """
+    Follow the listing pagination and fetch every detail page concurrently.
+
+    Barcode fetches for a page are scheduled as soon as that page is parsed, so
+    they overlap with the remaining pagination. In-flight requests are bounded
+    by the connector's per-host connection limit and the adaptive limiter's concurrency. With use_slug_barcodes, products
+    whose detail URL carries a valid GTIN take it instead of a fetch.
+    """
+    all_products = []
+    barcode_tasks = []
+    current_url = start_url
+    page_count = 0
+
+    logging.info(f"Starting async product scraping from {start_url}")
+
+    while current_url and page_count < max_pages:
+        page_count += 1
+        logging.debug(f"Scraping listing page {page_count}: {current_url}")
+        try:
+            products, next_url = parse_listing_page(await fetcher.fetch_text(current_url))
+        except Exception as e:
+            logging.error(f"Error scraping listing page {current_url}: {str(e)}")
+            break
+
+        logging.debug(f"Found {len(products)} products on page {page_count}")
+        all_products.extend(products)
+        barcode_tasks.extend(asyncio.create_task(async_scrape_single_barcode(fetcher, product))
+                             for product in products
+                             if product['detail_url'] and not (use_slug_barcodes and take_slug_barcode(product)))
+
+        current_url = next_url
+        if not current_url:
+            logging.info("No next page link found. Reached the last page.")
+
+    await asyncio.gather(*barcode_tasks)
+
+    summary = fetcher.stats.summary()
+    logging.info(f"Completed async scraping of {len(all_products)} products from {page_count} pages: "
+                 f"{summary['requests']} requests, p50 {summary['p50_latency']:.3f}s, "
+                 f"{summary['requests_per_second']:.2f} requests/s")
+    return all_products
+
+
+def run_async_crawl(session: requests.Session, start_url: str, max_pages: int = 999, use_slug_barcodes: bool = False,
+                    **fetcher_options) -> list[ProductRecord]:
+    """Run async_scrape_products on a fresh event loop and return the products with barcodes."""
+    async def crawl():
+        async with AsyncFetcher(session, **fetcher_options) as fetcher:
+            return await async_scrape_products(fetcher, start_url, max_pages, use_slug_barcodes)
+
+    return asyncio.run(crawl())
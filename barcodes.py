@@ -0,0 +1,191 @@
+"""Barcode validation: GTIN checksums, barcodes carried in detail URL slugs, and duplicate detection."""
+import logging
+import re
+import threading
+from urllib.parse import urldefrag, urlsplit
+
+from incremental import product_id_from_url
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# EAN-8, UPC-A and EAN-13
+GTIN_PATTERN = re.compile(r'[0-9]{8}|[0-9]{12,13}')
+
+# Barcode at the end of a detail slug, e.g. /produits/2516-3425-cadena-a-cle-couleur-40mm-8445542003157.html
+SLUG_BARCODE_PATTERN = re.compile(r'-([0-9]{8,14})\.html$')
+
+# Labels of the data sheet row holding the barcode, e.g. <dt class="name">EAN13</dt>
+BARCODE_LABEL_PATTERN = re.compile(r'ean|upc|gtin|code[\s-]*barre|barcode', re.IGNORECASE)
+
+# Every GTIN is checked as 14 digits, left-padded with zeros; the check digit is the last one
+GTIN_WIDTH = 14
+# A padded code that always fails the checksum, standing in for malformed barcodes
+_INVALID_GTIN = '0' * (GTIN_WIDTH - 1) + '1'
+
+# Row flags reported by validate_barcodes
+FLAGS = ('missing', 'invalid', 'slug_mismatch', 'duplicate')
+
+
+def _checksum_ok(code: str) -> bool:
+    digits = [int(digit) for digit in code.zfill(GTIN_WIDTH)]
+    return (sum(digit * (3 if i % 2 == 0 else 1) for i, digit in enumerate(digits[:-1])) + digits[-1]) % 10 == 0
+
+
+def checksums_valid(codes: list[str | None]) -> list[bool]:
+    """
+    Whether each code is a well-formed EAN-8, UPC-A or EAN-13 with a correct check digit.
+
+    All-zero codes such as 0000000000000 pass the checksum but are placeholders, so they are invalid.
+
+    With numpy the whole column is checked at once as a (rows, 14) digit matrix;
+    without it, code by code.
+    """
+    padded = [code.zfill(GTIN_WIDTH) if code and GTIN_PATTERN.fullmatch(code) and code.strip('0') else _INVALID_GTIN
+              for code in codes]
+    if np is None:
+        return [code is not _INVALID_GTIN and _checksum_ok(code) for code in padded]
+    if not padded:
+        return []
+
+    digits = (np.frombuffer(''.join(padded).encode('ascii'), dtype=np.uint8) - ord('0')).reshape(-1, GTIN_WIDTH)
+    weights = np.where(np.arange(GTIN_WIDTH - 1) % 2 == 0, 3, 1)
+    totals = digits[:, :-1].astype(np.int32) @ weights + digits[:, -1]
+    well_formed = np.fromiter((code is not _INVALID_GTIN for code in padded), dtype=bool, count=len(padded))
+    return ((totals % 10 == 0) & well_formed).tolist()
+
+
+def normalise_barcode(code: str) -> str:
+    """Compare UPC-A and EAN-13 forms of the same code equal, e.g. 012345678905 -> 0012345678905."""
+    return code.zfill(13) if len(code) == 12 else code
+
+
+def slug_barcodes(detail_urls: list[str | None]) -> list[str | None]:
+    """The valid GTIN at the end of each detail URL slug, or None where there isn't one."""
+    candidates = []
+    for url in detail_urls:
+        match = SLUG_BARCODE_PATTERN.search(urlsplit(urldefrag(url)[0]).path) if url else None
+        candidates.append(match.group(1) if match else None)
+    return [code if valid else None for code, valid in zip(candidates, checksums_valid(candidates))]
+
+
+def slug_barcode(detail_url: str | None) -> str | None:
+    """The valid GTIN at the end of a detail URL slug, e.g. ...-8445542003157.html -> 8445542003157."""
+    return slug_barcodes([detail_url])[0]
+
+
+def take_slug_barcode(product) -> bool:
+    """Use the barcode in the product's detail URL slug, if it has a valid one; return whether it did."""
+    barcode = slug_barcode(product['detail_url'])
+    if barcode:
+        product['barcode'] = barcode
+    return barcode is not None
+
+
+def apply_slug_barcodes(products: list) -> list:
+    """
+    Give every product whose slug carries a valid GTIN that barcode.
+
+    Returns the products that still need their detail page fetched.
+    """
+    to_fetch = []
+    for product, barcode in zip(products, slug_barcodes([product['detail_url'] for product in products])):
+        if barcode:
+            product['barcode'] = barcode
+        else:
+            to_fetch.append(product)
+    logging.info(f"Took {len(products) - len(to_fetch)} barcodes from detail URLs, "
+                 f"{len(to_fetch)} detail pages left to fetch")
+    return to_fetch
+
+
+def _product_id(product) -> str:
+    return product_id_from_url(product['detail_url']) or product['detail_url'] or product['name']
+
+
+def validate_barcodes(products: list) -> dict[str, list[int]]:
+    """
+    Check the barcode column of products and return the row indexes of each problem.
+
+    missing - no barcode; invalid - not an EAN-8 / UPC-A / EAN-13 or a wrong
+    check digit; slug_mismatch - the detail URL slug carries a different valid
+    GTIN; duplicate - the same barcode on products with different product IDs.
+    """
+    barcodes = [product['barcode'] or None for product in products]
+    detail_urls = [product['detail_url'] for product in products]
+    valid = checksums_valid(barcodes)
+    slugs = slug_barcodes(detail_urls)
+
+    report = {flag: [] for flag in FLAGS}
+    product_ids_by_barcode = {}
+    for i, (barcode, is_valid, slug) in enumerate(zip(barcodes, valid, slugs)):
+        if barcode is None:
+            report['missing'].append(i)
+            continue
+        if not is_valid:
+            report['invalid'].append(i)
+        if slug and normalise_barcode(slug) != normalise_barcode(barcode):
+            report['slug_mismatch'].append(i)
+        product_ids_by_barcode.setdefault(normalise_barcode(barcode), set()).add(_product_id(products[i]))
+
+    for i, barcode in enumerate(barcodes):
+        if barcode is not None and len(product_ids_by_barcode[normalise_barcode(barcode)]) > 1:
+            report['duplicate'].append(i)
+    return report
+
+
+class StreamingBarcodeCheck:
+    """
+    validate_barcodes for products checked one at a time, e.g. in the --pipeline detail stage.
+
+    Duplicates are found among the products added so far, so of the products
+    sharing a barcode only the later ones are flagged.
+    """
+
+    def __init__(self):
+        self._product_ids_by_barcode = {}
+        self._lock = threading.Lock()
+
+    def _problems(self, product) -> list[str]:
+        flags = [flag for flag, rows in validate_barcodes([product]).items() if rows]
+        barcode = product['barcode']
+        if barcode and self._product_ids_by_barcode.get(normalise_barcode(barcode), set()) - {_product_id(product)}:
+            flags.append('duplicate')
+        return flags
+
+    def problems(self, product) -> list[str]:
+        """The FLAGS that apply to product, without adding it."""
+        with self._lock:
+            return self._problems(product)
+
+    def add(self, product) -> list[str]:
+        """Check product once its barcode is final and remember its barcode, return its FLAGS."""
+        with self._lock:
+            flags = self._problems(product)
+            if product['barcode']:
+                self._product_ids_by_barcode.setdefault(normalise_barcode(product['barcode']), set()).add(
+                    _product_id(product))
+            return flags
+
+
+def suspicious_rows(report: dict[str, list[int]]) -> list[int]:
+    """Row indexes with any problem, in order."""
+    return sorted(set().union(*report.values()))
+
+
+def pick_barcode(candidates: list[tuple[str, str]]) -> str | None:
+    """
+    Choose the barcode among a detail page's (label, value) data sheet rows.
+
+    A valid GTIN in a row labelled EAN / UPC / code-barre wins, then any valid
+    GTIN; None if no row holds one.
+    """
+    values = [value.strip() for _, value in candidates]
+    valid = checksums_valid(values)
+    labelled = [value for (label, _), value, ok in zip(candidates, values, valid)
+                if ok and BARCODE_LABEL_PATTERN.search(label)]
+    if labelled:
+        return labelled[0]
+    return next((value for value, ok in zip(values, valid) if ok), None)
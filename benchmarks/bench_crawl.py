@@ -0,0 +1,205 @@
+"""
+End-to-end crawl benchmark against the local stand-in site.
+
+    python benchmarks/bench_crawl.py
+    python benchmarks/bench_crawl.py --sizes 100 1000 10000 100000 --mode threads --workers 16
+    python benchmarks/bench_crawl.py --latency 0.05 --error-rate 0.01 --json baseline.json
+    python benchmarks/bench_crawl.py --mode crawl --categories 8
+    python benchmarks/bench_crawl.py --adaptive 50 --capacity 20
+    python benchmarks/bench_crawl.py --mode sequential --latency 0.1 --prefetch 4
+
+For each catalogue size a fresh fake_site is started and the scraper runs
+login -> listing -> barcode -> CSV export against it, in a separate process so
+peak RSS is measured per run. Translation is skipped: it needs the OpenAI API.
+The crawl mode discovers the listings from the home page with the frontier
+crawler instead of starting at /produits. With --adaptive the adaptive
+politeness scheduler replaces the fixed --rate; give the site a --capacity to
+see it settle just under the rate the site tolerates. --prefetch requests that
+many listing pages ahead of the one being parsed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))
+os.environ.setdefault('OPENAI_API_KEY', 'unused-by-benchmark')
+
+from fake_site import start_in_background  # noqa: E402
+
+MODES = ('sequential', 'threads', 'pipeline', 'async', 'crawl')
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+# Paths of fake_site that are neither listing nor detail pages
+NON_PAGE_PATHS = {'/', '/connexion', '/robots.txt'}
+
+
+def is_page_fetch(response) -> bool:
+    """A listing or detail page served; login, the home page, robots.txt and 404 probes don't count."""
+    return response.status_code == 200 and urlsplit(response.url).path not in NON_PAGE_PATHS
+
+
+def run_crawl(base_url: str, mode: str, workers: int, rate: float, adaptive_max_rate: float, prefetch: int,
+              result_queue):
+    """Run one crawl in this (child) process and put its measurements on result_queue."""
+    import logging
+
+    import web_scrapper
+    from exporters import ProductCsvWriter, iter_records, save_products_to_csv
+    from fetching import attempt_login, find_login_links, new_session
+    from rate_limiter import AdaptiveRateLimiter, HostRateLimiter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    latencies = []
+    throttled = []
+    pages = []  # listing and detail pages the session fetched, see is_page_fetch
+    page_count = None
+    output = os.path.join(tempfile.mkdtemp(), 'products.csv')
+
+    started = time.perf_counter()
+    session = new_session()
+    session = attempt_login(find_login_links(base_url, session), 'bench@example.com', 'secret', session)
+    if session is None:
+        result_queue.put({'error': 'login failed'})
+        return
+    session.hooks['response'].append(lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds()))
+    session.hooks['response'].append(
+        lambda response, *args, **kwargs: throttled.append(1) if response.status_code == 429 else None)
+    session.hooks['response'].append(lambda response, *args, **kwargs: pages.append(1) if is_page_fetch(response) else None)
+    if adaptive_max_rate:
+        rate_limiter = AdaptiveRateLimiter(rate or 1.0, max_rate=adaptive_max_rate,
+                                           max_concurrency=max(workers, prefetch + 1))
+        rate_limiter.load_robots(session, base_url)
+        rate_limiter.attach(session)
+    else:
+        rate_limiter = HostRateLimiter(rate or 1e9, capacity=rate or 1e9)
+    start_url = f"{base_url}/produits?page=1"
+
+    if mode == 'pipeline':
+        with ProductCsvWriter(output) as writer:
+            web_scrapper.run_pipeline(session, start_url, writer, max_workers=workers, rate_limiter=rate_limiter,
+                                      translate=False, prefetch=prefetch)
+    elif mode == 'async':
+        import asyncio
+
+        from async_backend import AsyncFetcher, async_scrape_products
+
+        async def crawl():
+            async with AsyncFetcher(session, max_connections_per_host=workers, rate_limiter=rate_limiter) as fetcher:
+                products = await async_scrape_products(fetcher, start_url)
+                # The fetcher only requests listing and detail pages; failed attempts are retried
+                summary = fetcher.stats.summary()
+                return products, fetcher.stats.latencies, summary['requests'] - summary['errors']
+
+        products, latencies, page_count = asyncio.run(crawl())
+        save_products_to_csv(products, output)
+    else:
+        if mode == 'crawl':
+            from frontier import crawl_site
+
+            products = list(crawl_site(session, base_url, max_workers=workers, rate_limiter=rate_limiter,
+                                       prefetch=prefetch))
+        else:
+            products = list(web_scrapper.iter_product_listings(session, start_url, rate_limiter=rate_limiter,
+                                                               prefetch=prefetch))
+        web_scrapper.scrape_product_barcode(session, products, max_workers=1 if mode == 'sequential' else workers,
+                                            rate_limiter=rate_limiter)
+        save_products_to_csv(products, output)
+    elapsed = time.perf_counter() - started
+    if page_count is None:
+        page_count = len(pages)
+
+    # Stream the export back rather than loading it, as a consumer of a large CSV would
+    product_count = barcodes = 0
+    for record in iter_records(output):
+        product_count += 1
+        barcodes += record['barcode'] is not None
+
+    result_queue.put({
+        'products': product_count,
+        'barcodes': barcodes,
+        'requests': len(latencies),
+        'pages': page_count,
+        'seconds': elapsed,
+        'pages_per_second': page_count / elapsed,
+        'products_per_second': product_count / elapsed,
+        'p50_latency_ms': percentile(latencies, 0.50) * 1000,
+        'p99_latency_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # ru_maxrss is in KB on Linux
+        'throttled': len(throttled),
+        'final_rate': rate_limiter.current_rate(base_url) if adaptive_max_rate else rate,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="Catalogue sizes to crawl")
+    parser.add_argument('--mode', choices=MODES, default='threads')
+    parser.add_argument('--workers', type=int, default=8, help="Detail-page workers (connections per host for async)")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="Requests per second per host (0 = unlimited); the starting rate with --adaptive")
+    parser.add_argument('--adaptive', type=float, default=0, metavar='MAX_RATE',
+                        help="Use the adaptive politeness scheduler, capped at MAX_RATE requests per second")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help="Listing pages to fetch ahead of the one being parsed (not in async mode)")
+    parser.add_argument('--products-per-page', type=int, default=24)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the fake site adds to every response")
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--categories', type=int, default=0,
+                        help="Category listings served besides /produits (each product is in two)")
+    parser.add_argument('--capacity', type=float, default=0.0,
+                        help="Requests per second the fake site serves before answering 429 (0 = unlimited)")
+    parser.add_argument('--crawl-delay', type=int, default=0,
+                        help="Crawl-delay in whole seconds the fake site's robots.txt announces")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--json', metavar='PATH', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    print(f"{'products':>9} {'mode':>10} {'seconds':>9} {'pages/s':>9} {'products/s':>11} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'barcodes':>9} {'429s':>6} {'rate':>7}")
+    for size in args.sizes:
+        server, base_url = start_in_background(port=args.port, products=size, products_per_page=args.products_per_page,
+                                               latency=args.latency, latency_jitter=args.latency_jitter,
+                                               error_rate=args.error_rate, categories=args.categories,
+                                               capacity=args.capacity, crawl_delay=args.crawl_delay)
+        try:
+            result_queue = context.Queue()
+            crawler = context.Process(target=run_crawl, args=(base_url, args.mode, args.workers, args.rate, args.adaptive,
+                                                                    args.prefetch, result_queue))
+            crawler.start()
+            result = result_queue.get()
+            crawler.join()
+        finally:
+            server.terminate()
+            server.join()
+
+        result.update({'catalogue_size': size, 'mode': args.mode, 'workers': args.workers})
+        results.append(result)
+        if 'error' in result:
+            print(f"{size:>9} {args.mode:>10} {result['error']}")
+            continue
+        print(f"{size:>9} {args.mode:>10} {result['seconds']:>9.2f} {result['pages_per_second']:>9.1f} "
+              f"{result['products_per_second']:>11.1f} {result['p50_latency_ms']:>8.1f} {result['p99_latency_ms']:>8.1f} "
+              f"{result['peak_rss_mb']:>8.1f} {result['barcodes']:>9} {result['throttled']:>6} {result['final_rate']:>7.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark memory held per product by plain dicts versus ProductRecord.
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --sizes 10000 100000 1000000
+
+Each size runs the same steps as a scrape: build the listing products from
+freshly parsed strings, fill in barcodes, then translate the names. The dict
+path copies every product for translation as the scraper used to; the record
+path translates in place. Products are modelled on product_data.json by
+site_fixtures, and memory is measured with tracemalloc.
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from product_record import FIELDS, ProductRecord  # noqa: E402
+from site_fixtures import load_catalogue  # noqa: E402
+
+
+def fresh(value: str | None) -> str | None:
+    """A new string object, as parsing each page produces, instead of one shared with the catalogue."""
+    return None if value is None else (value + ' ')[:-1]
+
+
+def dict_products(catalogue: list[dict], translations: dict[str, str]) -> list[dict]:
+    products = [{field: fresh(product[field]) if field != 'barcode' else None for field in FIELDS}
+                for product in catalogue]
+    for product, source in zip(products, catalogue):
+        product['barcode'] = fresh(source['barcode'])
+    translated = []
+    for product in products:
+        translated_product = dict(product)
+        translated_product['name'] = translations[product['name']]
+        translated.append(translated_product)
+    return translated
+
+
+def record_products(catalogue: list[dict], translations: dict[str, str]) -> list[ProductRecord]:
+    products = [ProductRecord(**{field: fresh(product[field]) if field != 'barcode' else None for field in FIELDS})
+                for product in catalogue]
+    for product, source in zip(products, catalogue):
+        product['barcode'] = fresh(source['barcode'])
+    for product in products:
+        product['name'] = translations[product['name']]
+    return products
+
+
+def measure(build, catalogue: list[dict], translations: dict[str, str]) -> tuple[int, int]:
+    """Return (bytes still held by the products, peak bytes while building them)."""
+    gc.collect()
+    tracemalloc.start()
+    products = build(catalogue, translations)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del products
+    return held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'products':>10}  {'layout':<14}{'held MB':>10}{'peak MB':>10}{'bytes/product':>15}{'saving':>9}")
+    for size in args.sizes:
+        catalogue = load_catalogue(size)
+        # Translated names come from the translation cache, so they are shared between repeats of a product
+        translations = {product['name']: product['name'].upper() for product in catalogue}
+        baseline = None
+        for layout, build in [('dict', dict_products), ('ProductRecord', record_products)]:
+            held, peak = measure(build, catalogue, translations)
+            baseline = baseline or held
+            print(f"{size:>10}  {layout:<14}{held / 2**20:>10.1f}{peak / 2**20:>10.1f}{held / size:>15.0f}"
+                  f"{baseline / held:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Benchmark per-page parse time of listing and detail pages for each parser backend.
+
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --pages-dir saved_pages/   # listing_*.html and detail_*.html
+    python benchmarks/bench_parse.py --processes 1 2 4 8
+
+Without --pages-dir the pages are generated from product_data.json by site_fixtures.
+With --processes the pages are also parsed through the parse pool with each
+number of worker processes, fed by --fetch-threads threads the way the
+fetching threads feed it during a crawl, and compared with parsing on those
+threads directly.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import parsing  # noqa: E402
+from parsing import PACKAGING_PATTERN, PRICE_PER_UNIT_PATTERN  # noqa: E402
+from parse_pool import ParsePool  # noqa: E402
+from product_record import ProductRecord  # noqa: E402
+from site_fixtures import load_catalogue, render_detail_page, render_listing_page  # noqa: E402
+
+
+# The original per-field extractors: three selector passes per container and a full tree per detail page
+def extract_product_name(container) -> tuple[str, str | None]:
+    """Extract product name and detail URL from container."""
+    name_element = container.select_one('h3.product-title a')
+    name = name_element.get_text().strip() if name_element else "Unknown Product"
+    detail_url = name_element.get('href') if name_element else None
+    return name, detail_url
+
+
+def extract_price_info(container) -> tuple[str, str | None]:
+    """Extract price per carton and price per unit from container."""
+    # Price per carton
+    price_element = container.select_one('div.product-price-and-shipping span.price')
+    price_per_carton_str = price_element.get_text().strip() if price_element else "0,00 €"
+    price_per_carton = re.sub(r'[^\d,.]', '', price_per_carton_str).replace(',', '.')
+
+    # Price per unit
+    short_desc_element = container.select_one('p.an_short_description')
+    short_desc = short_desc_element.get_text().strip() if short_desc_element else ""
+    price_per_unit_match = PRICE_PER_UNIT_PATTERN.search(short_desc)
+    price_per_unit = price_per_unit_match.group(1).replace(',', '.') if price_per_unit_match else None
+
+    return price_per_carton, price_per_unit
+
+
+def extract_packaging_info(container) -> tuple[str | None, str | None]:
+    """Extract units per carton and packaging type from container."""
+    short_desc_element = container.select_one('p.an_short_description')
+    short_desc = short_desc_element.get_text().strip() if short_desc_element else ""
+
+    packaging_match = PACKAGING_PATTERN.search(short_desc)
+    if packaging_match:
+        return packaging_match.group(1), packaging_match.group(2)
+    return None, None
+
+
+def extract_barcode(soup) -> str | None:
+    """Extract the barcode from a product detail page."""
+    # Directly find the barcode element
+    barcode_element = soup.find('dd', class_='value')
+    return barcode_element.get_text().strip() if barcode_element else None
+
+
+def baseline_listing(html: str):
+    """The original path: html.parser tree plus three selector passes per container."""
+    soup = BeautifulSoup(html, 'html.parser')
+    products = []
+    for container in soup.select('article.product-miniature'):
+        name, detail_url = extract_product_name(container)
+        price_per_carton, price_per_unit = extract_price_info(container)
+        units_per_carton, packaging_type = extract_packaging_info(container)
+        products.append(ProductRecord(name, price_per_unit, price_per_carton, units_per_carton, packaging_type,
+                                      detail_url))
+    return products, parsing.get_next_page_url(soup)
+
+
+def baseline_detail(html: str):
+    return extract_barcode(BeautifulSoup(html, 'html.parser'))
+
+
+def with_backend(backend: str, function):
+    def run(html):
+        parsing.PARSER_BACKEND = backend
+        parsing.SOUP_PARSER = 'html.parser' if backend == 'selectolax' else backend
+        return function(html)
+    return run
+
+
+def time_per_page(function, pages: list[str], repeat: int) -> tuple[float, list]:
+    results = [function(page) for page in pages]  # warm up and keep results for the correctness check
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            function(page)
+    return (time.perf_counter() - started) / (repeat * len(pages)), results
+
+
+def report(title: str, pages: list[str], variants: list[tuple[str, object]], repeat: int):
+    print(f"\n{title}: {len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.0f} KB average")
+    print(f"{'backend':<32}{'ms/page':>10}{'speedup':>10}  matches baseline")
+    baseline_time = expected = None
+    for name, function in variants:
+        seconds, results = time_per_page(function, pages, repeat)
+        if baseline_time is None:
+            baseline_time, expected = seconds, results
+        print(f"{name:<32}{seconds * 1000:>10.2f}{baseline_time / seconds:>9.1f}x  {results == expected}")
+
+
+def pages_per_second(parse, pages: list[bytes], threads: int, repeat: int) -> tuple[float, list]:
+    """Parse every page from `threads` threads, as the fetching threads would, and return pages/s."""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(parse, pages))  # warm up: starts worker processes and imports
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(executor.map(parse, pages))
+    return repeat * len(pages) / (time.perf_counter() - started), results
+
+
+def report_scaling(title: str, pages: list[str], function, processes: list[int], threads: int, repeat: int):
+    """Throughput of function on the fetching threads, then in a ParsePool of each size."""
+    backend = parsing.PARSER_BACKEND
+    pages = [page.encode('utf-8') for page in pages]
+    print(f"\n{title} with {backend}, {threads} fetching threads ({os.cpu_count()} CPUs)")
+    print(f"{'processes':<32}{'pages/s':>10}{'speedup':>10}  matches in-thread")
+
+    def in_thread(page):
+        return function(page.decode('utf-8'))
+
+    baseline, expected = pages_per_second(in_thread, pages, threads, repeat)
+    print(f"{'0 (parse on fetching threads)':<32}{baseline:>10.1f}{1.0:>9.1f}x  True")
+    for count in processes:
+        pool = ParsePool(count, parsing.set_parser_backend, (backend,))
+        try:
+            rate, results = pages_per_second(lambda page: pool.parse(function, page, 'utf-8'), pages, threads, repeat)
+        finally:
+            pool.close()
+        print(f"{count:<32}{rate:>10.1f}{rate / baseline:>9.1f}x  {results == expected}")
+
+
+def load_pages(args) -> tuple[list[str], list[str]]:
+    if args.pages_dir:
+        def read(pattern):
+            return [open(path, encoding='utf-8').read() for path in sorted(glob.glob(os.path.join(args.pages_dir, pattern)))]
+        return read('listing_*.html'), read('detail_*.html')
+
+    catalogue = load_catalogue(args.products_per_page * args.listing_pages)
+    listing_pages = [
+        render_listing_page(catalogue[i:i + args.products_per_page], next_url=f'https://pali.plus/produits?page={n + 2}')
+        for n, i in enumerate(range(0, len(catalogue), args.products_per_page))
+    ]
+    return listing_pages, [render_detail_page(product) for product in catalogue[:args.detail_pages]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages-dir', help="Directory of saved listing_*.html and detail_*.html pages")
+    parser.add_argument('--listing-pages', type=int, default=5)
+    parser.add_argument('--products-per-page', type=int, default=24)
+    parser.add_argument('--detail-pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--processes', type=int, nargs='+', metavar='N',
+                        help="Also measure parsing through the parse pool with each of these process counts")
+    parser.add_argument('--fetch-threads', type=int, default=16, help="Threads feeding pages to the parse pool")
+    args = parser.parse_args()
+
+    listing_pages, detail_pages = load_pages(args)
+    backends = ['html.parser']
+    if parsing.LXML_AVAILABLE:
+        backends.append('lxml')
+    if parsing.SelectolaxParser:
+        backends.append('selectolax')
+
+    report("Listing pages", listing_pages,
+           [("baseline (html.parser, 3 passes)", baseline_listing)]
+           + [(f"{backend} single pass", with_backend(backend, parsing.parse_listing_page)) for backend in backends],
+           args.repeat)
+    detail_variants = [("baseline (html.parser, full tree)", baseline_detail)]
+    if parsing.LXML_AVAILABLE:
+        detail_variants.append(("lxml full tree", lambda html: extract_barcode(BeautifulSoup(html, 'lxml'))))
+    detail_variants.append(("streaming html.parser", with_backend('html.parser', parsing.parse_barcode)))
+    if parsing.SelectolaxParser:
+        detail_variants.append(("selectolax", with_backend('selectolax', parsing.parse_barcode)))
+    report("Detail pages", detail_pages, detail_variants, args.repeat)
+
+    if args.processes:
+        parsing.set_parser_backend(backends[-1])
+        report_scaling("Listing pages", listing_pages, parsing.parse_listing_page, args.processes,
+                       args.fetch_threads, args.repeat)
+        report_scaling("Detail pages", detail_pages, parsing.parse_barcode, args.processes,
+                       args.fetch_threads, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
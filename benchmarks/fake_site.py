@@ -0,0 +1,196 @@
+"""
+Local stand-in for pali.plus serving generated login, listing and detail pages.
+
+    python benchmarks/fake_site.py --products 1000 --latency 0.05 --error-rate 0.01
+    python benchmarks/fake_site.py --capacity 20 --crawl-delay 1
+
+Then point the scraper at it with `python web_scrapper.py --base-url http://127.0.0.1:8800`.
+Listing and detail pages need the session cookie set by a successful POST to /connexion.
+"""
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+from collections import deque
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from site_fixtures import load_catalogue, render_detail_page, render_home_page, render_listing_page, render_login_page
+
+SESSION_COOKIE = 'PrestaShop-bench=logged-in'
+
+
+class FakeSite:
+    """Catalogue, page size and fault injection settings for the stand-in site."""
+
+    def __init__(self, base_url: str, products: int = 1000, products_per_page: int = 24, latency: float = 0.0,
+                 latency_jitter: float = 0.0, error_rate: float = 0.0, require_login: bool = True,
+                 categories: int = 0, capacity: float = 0.0, crawl_delay: int = 0):
+        self.base_url = base_url
+        self.catalogue = load_catalogue(products, base_url)
+        self.products_by_path = {urlsplit(product['detail_url']).path: product for product in self.catalogue}
+        self.products_per_page = products_per_page
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.require_login = require_login
+        # Requests per second served before answering 429, like a site with a rate limit (0 = no limit)
+        self.capacity = capacity
+        self.crawl_delay = crawl_delay
+        self._recent_requests = deque()
+        self._lock = threading.Lock()
+        # Category i lists the products whose index modulo `categories` is i or i + 1, so each product is in two
+        self.categories = [
+            [product for j, product in enumerate(self.catalogue) if j % categories in (i, (i + 1) % categories)]
+            for i in range(categories)
+        ]
+
+    def over_capacity(self) -> bool:
+        """Count a request and return True if more than `capacity` arrived in the last second."""
+        if not self.capacity:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._recent_requests and self._recent_requests[0] < now - 1:
+                self._recent_requests.popleft()
+            self._recent_requests.append(now)
+            return len(self._recent_requests) > self.capacity
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.catalogue) // self.products_per_page))
+
+    def listing_page(self, page: int, products: list[dict] | None = None, path: str = '/produits') -> str | None:
+        products = self.catalogue if products is None else products
+        page_count = max(1, -(-len(products) // self.products_per_page))
+        if not 1 <= page <= page_count:
+            return None
+        start = (page - 1) * self.products_per_page
+        next_url = f"{self.base_url}{path}?page={page + 1}" if page < page_count else None
+        return render_listing_page(products[start:start + self.products_per_page], self.base_url, next_url)
+
+    def category_page(self, path: str, page: int) -> str | None:
+        """Listing page of /categorie-<i>, or None if there is no such category."""
+        index = path.removeprefix('/categorie-')
+        if not index.isdigit() or int(index) >= len(self.categories):
+            return None
+        return self.listing_page(page, self.categories[int(index)], path)
+
+
+def make_handler(site: FakeSite):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real site
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: str = '', headers: dict | None = None):
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _inject_faults(self) -> bool:
+            """Sleep for the configured latency; return True if this request should fail."""
+            delay = site.latency + random.uniform(0, site.latency_jitter)
+            if delay > 0:
+                time.sleep(delay)
+            if site.error_rate and random.random() < site.error_rate:
+                self._send(503, 'Service Unavailable', {'Retry-After': '1'})
+                return True
+            if site.over_capacity():
+                self._send(429, 'Too Many Requests', {'Retry-After': '1'})
+                return True
+            return False
+
+        def _logged_in(self) -> bool:
+            return SESSION_COOKIE in (self.headers.get('Cookie') or '')
+
+        def do_GET(self):
+            if self._inject_faults():
+                return
+            url = urlsplit(self.path)
+            if url.path == '/robots.txt':
+                rules = f"User-agent: *\nCrawl-delay: {site.crawl_delay}\n" if site.crawl_delay else "User-agent: *\n"
+                return self._send(200, rules)
+            if url.path == '/':
+                return self._send(200, render_home_page(site.base_url, self._logged_in()))
+            if url.path == '/connexion':
+                return self._send(200, render_login_page(site.base_url))
+            if site.require_login and not self._logged_in() and url.path != '/favicon.ico':
+                return self._send(302, '', {'Location': f"{site.base_url}/connexion?back=my-account"})
+            if url.path == '/produits':
+                page = int(parse_qs(url.query).get('page', ['1'])[0])
+                body = site.listing_page(page)
+                return self._send(200, body) if body else self._send(404, 'Not Found')
+            if url.path.startswith('/categorie-'):
+                body = site.category_page(url.path, int(parse_qs(url.query).get('page', ['1'])[0]))
+                return self._send(200, body) if body else self._send(404, 'Not Found')
+            product = site.products_by_path.get(url.path)
+            if product:
+                return self._send(200, render_detail_page(product, site.base_url))
+            self._send(404, 'Not Found')
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if urlsplit(self.path).path != '/connexion':
+                return self._send(404, 'Not Found')
+            self._send(200, render_home_page(site.base_url, logged_in=True),
+                       {'Set-Cookie': f"{SESSION_COOKIE}; Path=/"})
+
+    return Handler
+
+
+def serve(host: str = '127.0.0.1', port: int = 8800, **site_options):
+    base_url = f"http://{host}:{port}"
+    server = ThreadingHTTPServer((host, port), make_handler(FakeSite(base_url, **site_options)))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def start_in_background(host: str = '127.0.0.1', port: int = 8800, **site_options) -> tuple[multiprocessing.Process, str]:
+    """Run the site in a child process (so it doesn't count toward the scraper's RSS) and wait until it answers."""
+    process = multiprocessing.Process(target=serve, args=(host, port), kwargs=site_options, daemon=True)
+    process.start()
+    base_url = f"http://{host}:{port}"
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"{base_url}/connexion", timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Fake site did not start on {base_url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--products', type=int, default=1000, help="Catalogue size")
+    parser.add_argument('--products-per-page', type=int, default=24)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--categories', type=int, default=0,
+                        help="Serve this many /categorie-N listings, each product appearing in two of them")
+    parser.add_argument('--capacity', type=float, default=0.0,
+                        help="Answer 429 with Retry-After beyond this many requests per second (0 = unlimited)")
+    parser.add_argument('--crawl-delay', type=int, default=0, help="Crawl-delay in whole seconds to announce in /robots.txt")
+    args = parser.parse_args()
+
+    print(f"Serving {args.products} products on http://{args.host}:{args.port}")
+    serve(args.host, args.port, products=args.products, products_per_page=args.products_per_page,
+          latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+          categories=args.categories, capacity=args.capacity, crawl_delay=args.crawl_delay)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Generate pages that mirror pali.plus markup from product_data.json, for offline benchmarks."""
+import functools
+import html
+import json
+import os
+import re
+from urllib.parse import urlsplit
+
+PRODUCT_DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'product_data.json')
+
+# Leading product ID of a detail slug, e.g. /produits/2516-3425-cadena-... -> 2516
+SLUG_ID_PATTERN = re.compile(r'^(/[^/]+/)(\d+)-')
+
+
+def load_catalogue(size: int, base_url: str = 'https://pali.plus') -> list[dict]:
+    """
+    Return `size` products modelled on product_data.json.
+
+    The recorded products are repeated as often as needed; repeats get a new
+    product ID in their slug so every detail URL stays unique.
+    """
+    with open(PRODUCT_DATA_PATH, encoding='utf-8') as f:
+        recorded = json.load(f)
+
+    catalogue = []
+    for i in range(size):
+        product = dict(recorded[i % len(recorded)])
+        copy_number = i // len(recorded)
+        path = urlsplit(product['detail_url']).path  # path - /produits/2516-3425-cadena-a-cle-couleur-40mm-8445542003157.html
+        if copy_number:
+            path = SLUG_ID_PATTERN.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + copy_number * 100000}-", path)
+        product['detail_url'] = f"{base_url}{path}#/31-quantite-cartons"
+        catalogue.append(product)
+    return catalogue
+
+
+def _price(value: str | None) -> str:
+    return (value or '0.00').replace('.', ',') + ' €'
+
+
+@functools.lru_cache(maxsize=None)
+def _menu(base_url: str, links: int) -> str:
+    items = ''.join(f'<li class="category"><a href="{base_url}/categorie-{i}">Catégorie {i}</a></li>' for i in range(links))
+    return f'<nav class="top-menu"><ul>{items}</ul></nav>'
+
+
+@functools.lru_cache(maxsize=None)
+def _footer(base_url: str) -> str:
+    columns = ''.join(
+        f'<div class="col-md-3 links"><h4>Rubrique {c}</h4><ul>'
+        + ''.join(f'<li><a href="{base_url}/page-{c}-{i}">Lien {i}</a></li>' for i in range(25))
+        + '</ul></div>'
+        for c in range(4)
+    )
+    return f'<footer id="footer"><div class="container">{columns}</div><p>© Pali Plus - Grossiste</p></footer>'
+
+
+def _page(title: str, body: str, base_url: str, logged_in: bool = False) -> str:
+    account_links = (
+        f'<a href="{base_url}/mon-compte">My account</a><a href="{base_url}/?mylogout=">Logout</a>' if logged_in
+        else f'<a href="{base_url}/connexion?back=my-account">Connexion</a>'
+    )
+    return (
+        '<!doctype html><html lang="fr"><head><meta charset="utf-8">'
+        f'<title>{html.escape(title)}</title>'
+        + ''.join(f'<link rel="stylesheet" href="{base_url}/themes/css/{i}.css">' for i in range(8))
+        + f'</head><body><header id="header">{account_links}{_menu(base_url, 150)}</header>'
+        f'<main id="wrapper">{body}</main>{_footer(base_url)}</body></html>'
+    )
+
+
+def render_home_page(base_url: str = 'https://pali.plus', logged_in: bool = False) -> str:
+    """Front page linking to the login page and the one-level-deep product listing."""
+    body = (f'<section class="featured"><a href="{base_url}/produits">Tous les produits</a>'
+            f'<a href="{base_url}/nouveautes">Nouveautés</a><a href="{base_url}/promotions">Promotions</a></section>')
+    return _page('Pali Plus', body, base_url, logged_in)
+
+
+def render_login_page(base_url: str = 'https://pali.plus', token: str = 'b7e1c0') -> str:
+    """Login page with the same form fields as the real /connexion page."""
+    body = (
+        f'<form action="{base_url}/connexion" method="post" id="login-form">'
+        f'<input type="hidden" name="back" value="my-account"><input type="hidden" name="token" value="{token}">'
+        '<input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">'
+        '<input type="password" name="password" id="password" value="" class="form-control">'
+        '<input type="hidden" name="submitLogin" value="1"><button type="submit">Connexion</button></form>'
+    )
+    return _page('Connexion', body, base_url)
+
+
+def render_listing_page(products: list[dict], base_url: str = 'https://pali.plus', next_url: str | None = None,
+                        title: str = 'Produits', logged_in: bool = True) -> str:
+    """A category page with one article.product-miniature per product and an optional next link."""
+    articles = []
+    for product in products:
+        detail_url = html.escape(product['detail_url'])
+        name = html.escape(product['name'])
+        short_desc = f"{_price(product['price_per_unit']).replace(' €', '')} € / pcs"
+        if product['units_per_carton']:
+            short_desc += f" - {product['units_per_carton']} pcs / {product['packaging_type']}"
+        articles.append(
+            '<article class="product-miniature js-product-miniature">'
+            '<div class="thumbnail-container">'
+            f'<a href="{detail_url}" class="thumbnail product-thumbnail"><img src="{base_url}/img/p.jpg" alt="{name}"></a>'
+            '<div class="product-description">'
+            f'<h3 class="h3 product-title"><a href="{detail_url}">{name}</a></h3>'
+            '<div class="product-price-and-shipping"><span class="sr-only">Prix</span>'
+            f'<span class="price">{_price(product["price_per_carton"])}</span></div>'
+            f'<p class="an_short_description">{short_desc}</p>'
+            '</div></div></article>'
+        )
+    pagination = ''
+    if next_url:
+        pagination = f'<nav class="pagination"><a rel="next" href="{html.escape(next_url)}" class="next js-search-link">Suivant</a></nav>'
+    body = f'<section id="products"><div class="products row">{"".join(articles)}</div>{pagination}</section>'
+    return _page(title, body, base_url, logged_in)
+
+
+def render_detail_page(product: dict, base_url: str = 'https://pali.plus', logged_in: bool = True) -> str:
+    """A product page with the barcode in the first dd.value of the data sheet."""
+    name = html.escape(product['name'])
+    description = ''.join(f'<p>{name} - description du produit, ligne {i}.</p>' for i in range(40))
+    related = ''.join(
+        f'<article class="product-miniature"><a href="{base_url}/produits/{i}-related.html">Produit lié {i}</a></article>'
+        for i in range(30)
+    )
+    body = (
+        f'<div class="product-container"><h1>{name}</h1>'
+        f'<div class="current-price"><span>{_price(product["price_per_carton"])}</span></div>'
+        '<section class="product-features"><dl class="data-sheet">'
+        f'<dt class="name">EAN13</dt><dd class="value">{html.escape(product.get("barcode") or "")}</dd>'
+        f'<dt class="name">Conditionnement</dt><dd class="value">{product["units_per_carton"]} pcs</dd>'
+        f'</dl></section><div class="product-description">{description}</div>'
+        f'<section class="product-accessories">{related}</section></div>'
+    )
+    return _page(product['name'], body, base_url, logged_in)
@@ -0,0 +1,83 @@
+"""Append-only checkpoint journal so long crawls can be resumed after a crash."""
+import json
+import logging
+import os
+import threading
+
+
+class CheckpointJournal:
+    """
+    JSON Lines journal of crawl progress.
+
+    Each record is written as one line and fsynced before the call returns, so
+    a crash can at worst leave a torn last line, which load_checkpoint skips.
+    Record types:
+        start   - {'type': 'start', 'url': listing start URL}
+        page    - {'type': 'page', 'url', 'next_url', 'page_count', 'products': [...]}
+        barcode - {'type': 'barcode', 'detail_url', 'barcode'}
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=dict) + '\n'  # default=dict serialises ProductRecords
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record_start(self, url: str):
+        self._append({'type': 'start', 'url': url})
+
+    def record_page(self, url: str, next_url: str | None, page_count: int, products: list[dict]):
+        self._append({'type': 'page', 'url': url, 'next_url': next_url, 'page_count': page_count,
+                      'products': products})
+
+    def record_barcode(self, detail_url: str, barcode: str):
+        self._append({'type': 'barcode', 'detail_url': detail_url, 'barcode': barcode})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_checkpoint(path: str) -> dict | None:
+    """
+    Rebuild crawl state from a journal.
+
+    Returns {'next_url', 'page_count', 'products', 'barcodes'} where next_url is
+    the listing page to continue from (None once pagination finished) and
+    barcodes maps detail_url -> barcode for detail pages already scraped.
+    Returns None if there is no journal to resume from.
+    """
+    if not os.path.exists(path):
+        return None
+
+    state = {'next_url': None, 'page_count': 0, 'products': [], 'barcodes': {}}
+    started = False
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping torn checkpoint record at {path}:{line_number}")
+                continue
+
+            if record['type'] == 'start':
+                started = True
+                state['next_url'] = record['url']
+            elif record['type'] == 'page':
+                state['next_url'] = record['next_url']
+                state['page_count'] = record['page_count']
+                state['products'].extend(record['products'])
+            elif record['type'] == 'barcode':
+                state['barcodes'][record['detail_url']] = record['barcode']
+
+    if not started:
+        return None
+    logging.info(f"Loaded checkpoint {path}: {state['page_count']} pages, {len(state['products'])} products, "
+                 f"{len(state['barcodes'])} barcodes")
+    return state
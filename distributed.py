@@ -0,0 +1,232 @@
+"""
+Coordinator/worker crawl: processes pull listing and detail pages from a shared SQLite work queue.
+
+The coordinator seeds the queue, starts local worker processes and merges
+their results. Workers on other machines can join through a shared queue file:
+
+    python distributed.py worker --queue crawl_queue.sqlite --base-url https://pali.plus --shards 0 1
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Iterable
+from urllib.parse import urljoin
+
+import requests
+from dotenv import load_dotenv
+
+from barcodes import take_slug_barcode
+from fetching import (
+    DEFAULT_REQUESTS_PER_SECOND,
+    attempt_login,
+    find_login_links,
+    new_session,
+    scrape_single_barcode,
+)
+from parsing import parse_listing_page
+from product_record import ProductRecord
+from rate_limiter import SharedRateLimiter
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue
+
+DEFAULT_QUEUE_PATH = 'crawl_queue.sqlite'
+
+# How long an idle worker waits before asking the queue again
+IDLE_POLL_SECONDS = 0.5
+
+# How often the coordinator checks on its workers and logs progress
+MONITOR_INTERVAL = 1.0
+PROGRESS_LOG_INTERVAL = 15.0
+
+
+def process_listing_task(session: requests.Session, queue: WorkQueue, task: dict, rate_limiter: SharedRateLimiter,
+                         max_pages: int):
+    """Fetch one listing page, queue its products as detail tasks and its next page as a listing task."""
+    rate_limiter.acquire(task['url'])
+    response = session.get(task['url'])
+    response.raise_for_status()
+    products, next_url = parse_listing_page(response.text)
+    # Products without a detail page still go through the queue so they reach the merged output
+    queue.put_many('detail', [(product['detail_url'] or product['name'], product) for product in products])
+    page = task['payload']['page']
+    if next_url and page < max_pages:
+        queue.put('listing', urljoin(task['url'], next_url), {'page': page + 1})
+    logging.debug(f"Listing page {page} at {task['url']}: {len(products)} products")
+
+
+def process_detail_task(session: requests.Session, task: dict, rate_limiter: SharedRateLimiter,
+                        use_slug_barcodes: bool = False) -> dict:
+    """Fetch one product's barcode, unless its detail URL carries one, and return the finished product."""
+    product = task['payload']
+    if use_slug_barcodes and product['detail_url'] and take_slug_barcode(product):
+        return product
+    if product['detail_url'] and not scrape_single_barcode(session, product, rate_limiter):
+        raise RuntimeError(f"could not fetch {product['detail_url']}")
+    return product
+
+
+def run_worker(queue_path: str, base_url: str, worker_id: str | None = None, shards: list[int] | None = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+    """
+    Log in with its own session, then lease and process tasks until the queue is drained.
+
+    The request rate and page limit come from the queue, so every worker
+    shares the budget the coordinator set. Returns the number of tasks done.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    rate_limiter = SharedRateLimiter(queue_path, queue.get_meta('rate', DEFAULT_REQUESTS_PER_SECOND))
+    max_pages = queue.get_meta('max_pages', 999)
+    use_slug_barcodes = queue.get_meta('use_slug_barcodes', False)
+
+    session = new_session()
+    session = attempt_login(find_login_links(base_url, session), os.getenv('EMAIL'), os.getenv('PASSWORD'), session)
+    if session is None:
+        raise RuntimeError(f"Worker {worker_id} could not log in")
+
+    done = 0
+    while True:
+        task = queue.lease(worker_id, shards)
+        if task is None:
+            if queue.is_drained():
+                break
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        try:
+            if task['kind'] == 'listing':
+                process_listing_task(session, queue, task, rate_limiter, max_pages)
+                result = None
+            else:
+                result = process_detail_task(session, task, rate_limiter, use_slug_barcodes)
+        except Exception as e:
+            logging.warning(f"Worker {worker_id} failed {task['kind']} task {task['url']} "
+                            f"(attempt {task['attempts']}): {str(e)}")
+            queue.fail(task['id'], worker_id, str(e))
+            continue
+        if queue.complete(task['id'], worker_id, result):
+            done += 1
+        else:
+            logging.warning(f"Worker {worker_id} lost the lease on {task['url']}, another worker redid it")
+
+    logging.info(f"Worker {worker_id} finished after {done} tasks")
+    rate_limiter.close()
+    queue.close()
+    return done
+
+
+def _worker_main(*args, **kwargs):
+    """Process entry point: a non-zero exit code tells the coordinator to requeue this worker's leases."""
+    # Spawned processes start with default logging; the environment, including .env values, is inherited
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        run_worker(*args, **kwargs)
+    except Exception as e:
+        logging.error(f"Worker crashed: {str(e)}")
+        raise SystemExit(1)
+
+
+def run_coordinator(base_url: str, start_urls: Iterable[str] = (),
+                    discover: Callable[[SharedRateLimiter], Iterable[ProductRecord]] | None = None,
+                    workers: int = 4, rate: float = DEFAULT_REQUESTS_PER_SECOND, max_pages: int = 999,
+                    queue_path: str = DEFAULT_QUEUE_PATH, shards: int = 1,
+                    lease_seconds: float = DEFAULT_LEASE_SECONDS, max_restarts: int | None = None,
+                    use_slug_barcodes: bool = False) -> list[ProductRecord]:
+    """
+    Crawl with `workers` local processes sharing one work queue and one request budget.
+
+    start_urls are listing pages for the workers to paginate. discover, if
+    given, is called with the shared rate limiter and returns products (e.g.
+    a crawl_site() generator) whose detail pages are queued while the workers
+    are already running. Workers that exit abnormally have their leases
+    requeued and are replaced, up to max_restarts times. With use_slug_barcodes,
+    workers skip the detail page of products whose URL carries a valid GTIN.
+    Returns every product, in the order they were queued.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(queue_path + suffix):
+            os.remove(queue_path + suffix)
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    # Workers, including ones started by hand on other machines, read these settings from the queue
+    queue.set_meta('shards', shards)
+    queue.set_meta('rate', rate)
+    queue.set_meta('max_pages', max_pages)
+    queue.set_meta('use_slug_barcodes', use_slug_barcodes)
+    queue.put_many('listing', [(url, {'page': 1}) for url in start_urls])
+
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    restarts = 0
+    max_restarts = workers * 3 if max_restarts is None else max_restarts
+
+    def start_worker():
+        worker_id = f"{socket.gethostname()}-worker-{uuid.uuid4().hex[:8]}"
+        process = context.Process(target=_worker_main, args=(queue_path, base_url, worker_id),
+                                  kwargs={'lease_seconds': lease_seconds}, daemon=True)
+        process.start()
+        processes[worker_id] = process
+
+    logging.info(f"Starting {workers} workers on {queue_path} at {rate} requests/s in total")
+    for _ in range(workers):
+        start_worker()
+
+    # Feed the queue from the coordinator while the workers run
+    rate_limiter = SharedRateLimiter(queue_path, rate)
+    batch = []
+    for product in discover(rate_limiter) if discover else ():
+        batch.append((product['detail_url'] or product['name'], product))
+        if len(batch) >= 100:
+            queue.put_many('detail', batch)
+            batch = []
+    queue.put_many('detail', batch)
+    queue.close_input()
+
+    last_progress = time.monotonic()
+    while processes:
+        time.sleep(MONITOR_INTERVAL)
+        for worker_id, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            del processes[worker_id]
+            if process.exitcode != 0:
+                requeued = queue.release_owner(worker_id)
+                logging.warning(f"Worker {worker_id} died (exit code {process.exitcode}), "
+                                f"requeued its {requeued} leased tasks")
+                if not queue.is_drained() and restarts < max_restarts:
+                    restarts += 1
+                    start_worker()
+        if time.monotonic() - last_progress >= PROGRESS_LOG_INTERVAL:
+            logging.info(f"Work queue: {queue.counts()}")
+            last_progress = time.monotonic()
+
+    rate_limiter.close()
+    counts = queue.counts()
+    if not queue.is_drained():
+        logging.error(f"All workers exited with work left: {counts}")
+    logging.info(f"Distributed crawl finished: {counts}")
+    products = [ProductRecord.from_mapping(product) for product in queue.iter_results('detail')]
+    queue.close()
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    worker_parser = subparsers.add_parser('worker', help="Join a running crawl as an extra worker")
+    worker_parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="Work queue file shared with the coordinator")
+    worker_parser.add_argument('--base-url', default='https://pali.plus', help="Site to log in to")
+    worker_parser.add_argument('--shards', type=int, nargs='+', help="Only take tasks from these shards")
+    worker_parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                               help="How long a task may take before other workers take it over")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run_worker(args.queue, args.base_url, shards=args.shards, lease_seconds=args.lease_seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Streaming product writers: CSV, JSON Lines, Parquet and SQLite upsert, all with typed numeric columns."""
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator
+
+from incremental import product_id_from_url
+
+FIELDNAMES = ['name', 'price_per_unit', 'price_per_carton', 'units_per_carton', 'packaging_type', 'detail_url', 'barcode']
+
+# Column types; barcodes stay strings so leading zeros survive
+FIELD_TYPES = {
+    'name': str,
+    'price_per_unit': float,
+    'price_per_carton': float,
+    'units_per_carton': int,
+    'packaging_type': str,
+    'detail_url': str,
+    'barcode': str
+}
+
+FORMATS = ('csv', 'jsonl', 'parquet', 'sqlite')
+
+# File extension -> format, e.g. product_data.parquet -> 'parquet'
+EXTENSION_FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.sqlite': 'sqlite',
+    '.db': 'sqlite'
+}
+
+
+def to_record(product: dict) -> dict:
+    """Project a scraped product onto FIELDNAMES with typed values, e.g. '13.20' -> 13.2 and '' -> None."""
+    record = {}
+    for field, field_type in FIELD_TYPES.items():
+        value = product.get(field)
+        if value is None or value == '':
+            record[field] = None
+            continue
+        try:
+            record[field] = field_type(value)
+        except ValueError:
+            logging.warning(f"Invalid {field} {value!r} for {product.get('name')}, writing it as empty")
+            record[field] = None
+    return record
+
+
+class ProductWriter(ABC):
+    """Base class for writers that take one product at a time as it is produced."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+
+    def write(self, product: dict):
+        self._write_record(to_record(product))
+        self.count += 1
+
+    def write_many(self, products: Iterable[dict]):
+        for product in products:
+            self.write(product)
+
+    @abstractmethod
+    def _write_record(self, record: dict):
+        """Write one typed record, see to_record."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ProductCsvWriter(ProductWriter):
+    """Write products to a CSV file one row at a time as they are produced."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDNAMES)
+        self._writer.writeheader()
+
+    def _write_record(self, record: dict):
+        self._writer.writerow(record)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesWriter(ProductWriter):
+    """One JSON object per line, so readers can stream the file instead of loading one big array."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_record(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(ProductWriter):
+    """Columnar output (needs pyarrow); rows are buffered and written as one row group per batch_size rows."""
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        # pyarrow is optional and slow to import, so only load it when Parquet is asked for
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from None
+        super().__init__(path)
+        self._pa = pa
+        self.batch_size = batch_size
+        self.schema = pa.schema([
+            ('name', pa.string()),
+            ('price_per_unit', pa.float64()),
+            ('price_per_carton', pa.float64()),
+            ('units_per_carton', pa.int32()),
+            ('packaging_type', pa.dictionary(pa.int8(), pa.string())),  # a handful of values, e.g. 'carton'
+            ('detail_url', pa.string()),
+            ('barcode', pa.string())
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self._rows = []
+
+    def _write_record(self, record: dict):
+        self._rows.append(record)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class SqliteWriter(ProductWriter):
+    """
+    Upsert products into a SQLite table keyed by product ID.
+
+    Rerunning into the same database updates changed rows in place. A missing
+    barcode never overwrites one found by an earlier run.
+    """
+
+    def __init__(self, path: str, table: str = 'products', batch_size: int = 500):
+        super().__init__(path)
+        self.table = table
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'product_id TEXT PRIMARY KEY, name TEXT, price_per_unit REAL, price_per_carton REAL, '
+            'units_per_carton INTEGER, packaging_type TEXT, detail_url TEXT, barcode TEXT, updated_at REAL)'
+        )
+        self._upsert = (
+            f'INSERT INTO {table} (product_id, {", ".join(FIELDNAMES)}, updated_at) '
+            f'VALUES (?, {", ".join("?" for _ in FIELDNAMES)}, ?) '
+            'ON CONFLICT(product_id) DO UPDATE SET '
+            + ', '.join(f'{field} = excluded.{field}' for field in FIELDNAMES if field != 'barcode')
+            + f', barcode = COALESCE(excluded.barcode, {table}.barcode), updated_at = excluded.updated_at'
+        )
+        self._rows = []
+
+    def _write_record(self, record: dict):
+        # Fall back to the URL for products whose slug has no ID
+        product_id = product_id_from_url(record['detail_url']) or record['detail_url'] or record['name']
+        self._rows.append((product_id, *(record[field] for field in FIELDNAMES), time.time()))
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            with self._conn:
+                self._conn.executemany(self._upsert, self._rows)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._conn.close()
+
+
+class MultiWriter(ProductWriter):
+    """Send every product to several writers, e.g. a Parquet file and a SQLite upsert."""
+
+    def __init__(self, writers: list[ProductWriter]):
+        super().__init__(', '.join(writer.path for writer in writers))
+        self.writers = writers
+
+    def _write_record(self, record: dict):
+        # The product is typed once and the same record handed to every writer
+        for writer in self.writers:
+            writer._write_record(record)
+            writer.count += 1
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+WRITERS = {'csv': ProductCsvWriter, 'jsonl': JsonLinesWriter, 'parquet': ParquetWriter, 'sqlite': SqliteWriter}
+
+
+def format_for_path(path: str) -> str:
+    """Pick the output format from the file extension, defaulting to CSV."""
+    return EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def open_writer(path: str, output_format: str | None = None) -> ProductWriter:
+    """Open a writer for path, in output_format or the format its extension implies."""
+    return WRITERS[output_format or format_for_path(path)](path)
+
+
+def save_products(products: Iterable[dict], path: str, output_format: str | None = None) -> int:
+    """Write products to path and return how many were written."""
+    with open_writer(path, output_format) as writer:
+        writer.write_many(products)
+    return writer.count
+
+
+def save_products_to_csv(products: list[dict], filename: str):
+    save_products(products, filename, 'csv')
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Lazily read typed records back from a CSV or JSON Lines export."""
+    output_format = format_for_path(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if output_format == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif output_format == 'csv':
+            for row in csv.DictReader(f):
+                yield to_record(row)
+        else:
+            raise ValueError(f"iter_records reads CSV and JSON Lines, not {output_format}")
@@ -0,0 +1,304 @@
+"""Sessions, login, polite fetching and detail page barcodes, shared by every crawl mode."""
+import logging
+import threading
+import time
+
+import requests
+
+from checkpoint import CheckpointJournal
+from metrics import METRICS
+from parsing import make_soup, parse_barcode
+from rate_limiter import THROTTLE_STATUSES, AdaptiveRateLimiter, HostRateLimiter, parse_retry_after
+
+# Throttled (429/503) responses are retried this many times, after the wait the server asked for
+THROTTLE_RETRIES = 2
+
+# Default per-host budget for concurrent fetching, roughly matching the old 2-3 s sleep
+DEFAULT_REQUESTS_PER_SECOND = 0.4
+
+# Links followed from the home page when crawling for listing pages, e.g. home -> category -> subcategory
+DEFAULT_MAX_DEPTH = 2
+
+
+def find_login_links(url: str, session: requests.Session):
+    """Find potential login links on the main page, fetched with the session that will log in"""
+    try:
+        response = session.get(url) 
+        soup = make_soup(response.text) 
+        
+        # Look for common login link patterns
+        login_keywords = ['login', 'sign in', 'account', 'my account']
+        potential_links = []
+        
+        for link in soup.find_all('a'): # link - <a href="https://pali.plus/login">Login</a>
+            href = link.get('href', '').lower() # href - https://pali.plus/login
+            text = link.get_text().lower() # text - Login  
+            
+            if any(keyword in href or keyword in text for keyword in login_keywords):
+                potential_links.append({
+                    'text': link.get_text().strip(),
+                    'href': link.get('href')
+                })
+        
+        logging.info("Found potential login links:")
+        for link in potential_links:
+            if not link['href'].startswith('http'):
+                link['href'] = 'https:' + link['href']
+            logging.info(f"Text: {link['text']}, URL: {link['href']}")
+            
+        return potential_links
+        
+    except Exception as e:
+        logging.error(f"Error finding login links: {str(e)}")
+        return []
+
+
+def analyze_forms(soup):
+    """
+    Find all forms and their fields:
+        
+    e.g.
+    form - <form action="https://pali.plus/connexion" method="post">
+    input - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
+    """
+    forms_data = []
+    for form in soup.find_all('form'):
+        form_data = {
+            'action': form.get('action'), 
+            'method': form.get('method', 'GET'), 
+            'inputs': [] 
+        }
+        
+        # Get all input fields
+        for input_field in form.find_all('input'): # input_field - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
+            form_data['inputs'].append({
+                'name': input_field.get('name'),
+                'type': input_field.get('type'),
+                'value': input_field.get('value', '')
+            })
+        
+        forms_data.append(form_data) # form_data - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
+    
+    return forms_data
+
+
+def find_login_form(forms_data):
+    """Find the form that looks like a login form
+    
+    e.g.
+    form - <form action="https://pali.plus/connexion" method="post">
+    input - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
+    """
+    for form in forms_data: # form - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
+        has_email = False
+        has_password = False
+        
+        for input_field in form['inputs']: # input_field - {'name': 'email', 'type': 'email', 'value': ''}
+            if input_field['type'] in ['email', 'text'] and 'email' in input_field['name'].lower(): 
+                has_email = True
+            if input_field['type'] == 'password':
+                has_password = True
+        
+        if has_email and has_password: 
+            return form
+    
+    return None
+
+
+def new_session() -> requests.Session:
+    """Create a session with browser-like headers."""
+    session = requests.Session()
+    # Add browser-like headers, strongly preferring English
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',  # Strongly prefer English - Yeah hates me and doesn't work :(
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1'
+    })
+    return session
+
+
+def is_logged_in(html: str) -> bool:
+    """Logged-in pages show a logout or my account link."""
+    text = html.lower()
+    return 'logout' in text or 'my account' in text
+
+
+def login_with_form(session: requests.Session, login_form: dict, email: str, password: str) -> bool:
+    """Fill in and submit a login form found by find_login_form, return True if the site shows us logged in."""
+    # Now we can prepare the login data
+    login_data = {} # login_data - {'email': 'test@test.com', 'password': 'our_password'}
+    for input_field in login_form['inputs']: # input_field - {'name': 'email', 'type': 'email', 'value': ''}
+        if input_field['type'] in ['email', 'text'] and 'email' in input_field['name'].lower():
+            login_data[input_field['name']] = email # login_data - {'email': 'test@test.com'}
+        elif input_field['type'] == 'password':
+            login_data[input_field['name']] = password # login_data - {'email': 'test@test.com', 'password': 'our_password'}
+        elif input_field['type'] == 'hidden':
+            login_data[input_field['name']] = input_field['value']
+
+    # Submit the form
+    if login_form['method'].lower() == 'post':
+        response = session.post(login_form['action'], data=login_data)
+    else:
+        response = session.get(login_form['action'], params=login_data)
+
+    # Check if login was successful
+    if is_logged_in(response.text):
+        logging.info("Login successful!")
+        return True
+
+    # Log the form action URL correctly
+    form_action = login_form['action']
+    if form_action.startswith('//'):
+        form_action = 'https:' + form_action
+    logging.warning(f"Login submission to {form_action} seemed successful (status {response.status_code}) but couldn't confirm login.")
+    return False
+
+
+def discover_login(potential_links: list[dict], email: str, password: str,
+                   session: requests.Session | None = None) -> tuple[requests.Session | None, dict | None]:
+    """
+    Try each potential login link until one has a login form that works.
+
+    Logs in on session, e.g. the one find_login_links used, or a new_session().
+    Returns the logged-in session and {'url', 'form'} describing the login page
+    and form used, or (None, None) if every link failed.
+    """
+    session = session or new_session()
+    
+    logging.info(f"Attempting to login with email: {email} and password: {password}")
+    logging.info(f"Potential links: {potential_links}")
+    for link in potential_links: # link - {'text': 'Login', 'href': 'https://pali.plus/connexion?back=my-account'}
+        logging.info(f"Attempting to login with link: {link}")
+        try:
+            login_url = link['href'] # login_url - https://pali.plus/connexion?back=my-account
+            response = session.get(login_url)  # Use session.get instead of requests.get
+            soup = make_soup(response.text)
+            
+            # Get all forms and their fields
+            forms_data = analyze_forms(soup) # forms_data - [{'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}]
+            login_form = find_login_form(forms_data) # login_form - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
+            
+            if login_form:
+                logging.info("Found login form!") 
+                logging.info(f"Form action: {login_form['action']}") # Form action: https://pali.plus/connexion
+                logging.info(f"Form method: {login_form['method']}") # Form method: POST
+                logging.info(f"Input fields: {login_form['inputs']}") # Input fields: [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]
+                
+                if login_with_form(session, login_form, email, password):
+                    return session, {'url': login_url, 'form': login_form}
+            
+        except Exception as e:
+            logging.error(f"Error attempting login at {link['href']}: {str(e)}")
+    
+    logging.error("Failed to login using any of the potential links")
+    return None, None
+
+
+def attempt_login(potential_links: list[dict], email: str, password: str, session: requests.Session | None = None):
+    """Attempt to login using each potential login form, return session on success."""
+    session, _ = discover_login(potential_links, email, password, session)
+    return session # Return None if login fails
+
+
+def polite_get(session: requests.Session, url: str, rate_limiter=None) -> tuple[requests.Response, float]:
+    """
+    GET url once the rate limiter allows it, retrying 429/503 responses.
+
+    The adaptive limiter already pauses the host for the Retry-After it saw;
+    with any other limiter the wait is slept here. Returns the response and
+    the seconds spent waiting for the rate limiter.
+    """
+    waited = 0.0
+    for attempt in range(THROTTLE_RETRIES + 1):
+        if rate_limiter:
+            wait = rate_limiter.acquire(url)
+            METRICS.observe('wait.rate_limit', wait)
+            waited += wait
+        try:
+            response = session.get(url)
+        finally:
+            if isinstance(rate_limiter, AdaptiveRateLimiter):
+                # The response hook already freed the slot, unless the request raised
+                rate_limiter.release(url)
+        if response.status_code not in THROTTLE_STATUSES or attempt == THROTTLE_RETRIES:
+            return response, waited
+        METRICS.inc('http.retries')
+        logging.debug(f"Got {response.status_code} from {url}, retrying")
+        if not isinstance(rate_limiter, AdaptiveRateLimiter):
+            delay = parse_retry_after(response.headers.get('Retry-After')) or 2 ** attempt
+            METRICS.observe('wait.sleep', delay)
+            time.sleep(delay)
+
+
+class FetchStats:
+    """Per-request latency and throughput counters for the detail-page fetches."""
+
+    def __init__(self):
+        self.latencies = []  # latencies - seconds per completed request
+        self.errors = 0
+        self.rate_limit_wait = 0.0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool = True, waited: float = 0.0):
+        with self._lock:
+            self.latencies.append(latency)
+            self.rate_limit_wait += waited
+            if not ok:
+                self.errors += 1
+
+    def summary(self) -> dict:
+        """Return request count, latency percentiles and throughput so far."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.monotonic() - self.started
+            errors = self.errors
+            waited = self.rate_limit_wait
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_latency': percentile(0.50),
+            'p95_latency': percentile(0.95),
+            'max_latency': latencies[-1] if latencies else 0.0,
+            'rate_limit_wait': waited,
+            'elapsed': elapsed,
+            'requests_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0
+        }
+
+
+def scrape_single_barcode(session: requests.Session, product: dict, rate_limiter: HostRateLimiter | None = None,
+                          stats: FetchStats | None = None, journal: CheckpointJournal | None = None):
+    """Fetch one product's detail page and store the barcode on the product dict, return False on errors."""
+    logging.debug(f"Scraping barcode for {product['name']} from {product['detail_url']}")
+    started = time.monotonic()
+    waited = 0.0
+    ok = True
+    try:
+        response, waited = polite_get(session, product['detail_url'], rate_limiter)
+        response.raise_for_status()
+
+        # Detail pages stay on the fetching thread: the streaming barcode parser is cheaper than the round trip to the pool
+        barcode = parse_barcode(response.text)
+        if barcode:
+            product['barcode'] = barcode
+            logging.debug(f"Found barcode for {product['name']}: {barcode}")
+            METRICS.inc('barcodes.found')
+            if journal:
+                journal.record_barcode(product['detail_url'], barcode)
+        else:
+            logging.warning(f"Barcode not found for {product['name']}")
+            METRICS.inc('barcodes.missing')
+    except Exception as e:
+        ok = False
+        METRICS.inc('barcodes.errors')
+        logging.error(f"Error scraping barcode for {product['name']}: {str(e)}")
+    finally:
+        if stats:
+            stats.record(time.monotonic() - started, ok, waited)
+    return ok
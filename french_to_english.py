@@ -1,85 +1,429 @@
+import hashlib
 import json
 import logging
 import threading
 import time
-from queue import Queue
-from typing import List, Dict
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Dict
+import openai
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+from metrics import METRICS
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI client
+# Configure OpenAI client, created on first use so importing this module stays cheap, e.g. in parse pool workers
 openai_api_key = os.getenv('OPENAI_API_KEY')
-openai_client = OpenAI(api_key=openai_api_key)
+_openai_client = None
+_openai_client_lock = threading.Lock()
 
-def translate_product_to_english(product: dict, result_queue: Queue) -> None:
-    """Translate a single product to English and put result in queue."""
-    try:
-        # Prepare the prompt with the product data
-        prompt = f"""
-        Translate the following product information from French to English. 
-        Keep the numbers and URLs exactly as they are, only translate the text fields.
-        Return the data in the same format but with English translations.
+def get_openai_client() -> OpenAI:
+    """The shared OpenAI client, created on first use."""
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(api_key=openai_api_key)
+        return _openai_client
+
+# Text fields worth translating; prices, units, URLs and barcodes are left untouched
+TRANSLATED_FIELDS = ('name', 'packaging_type')
+DEFAULT_CACHE_PATH = 'translation_cache.json'
+
+# Batched translation: strings per request, and the completion budget a batch has to fit in
+DEFAULT_BATCH_SIZE = 50
+MAX_OUTPUT_TOKENS = 2000
+TOKENS_PER_ITEM = 8  # '"12": "...",' JSON framing around each translation
+
+# Concurrent translation requests, and how often a throttled or failed request is retried
+DEFAULT_TRANSLATE_WORKERS = 4
+MAX_API_RETRIES = 5
+RETRYABLE_API_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+class TranslationCache:
+    """Persistent French -> English string cache keyed by the SHA-256 of the source string."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.api_calls = 0
+        self.api_strings = 0
+        self.api_seconds = 0.0
+        self._lock = threading.Lock()
+        self._translations = None  # read from path on first use
+
+    def _load(self) -> dict:
+        """The translations, read from the cache file on first use; call with the lock held."""
+        if self._translations is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._translations = json.load(f)
+            except FileNotFoundError:
+                self._translations = {}
+        return self._translations
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-        Product Data:
-        {json.dumps(product, indent=2, ensure_ascii=False)}
+    def get(self, text: str) -> str | None:
+        with self._lock:
+            return self._load().get(self.key(text))
+
+    def put(self, text: str, translation: str):
+        with self._lock:
+            self._load()[self.key(text)] = translation
+
+    def record_lookup(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        METRICS.inc('translation.cache_hits' if hit else 'translation.cache_misses')
+
+    def record_deduplicated(self, count: int = 1):
+        """Count lookups of strings another request in this run was already translating."""
+        with self._lock:
+            self.deduplicated += count
+        METRICS.inc('translation.deduplicated', count)
+
+    def record_api_call(self, seconds: float, strings: int):
+        with self._lock:
+            self.api_calls += 1
+            self.api_strings += strings
+            self.api_seconds += seconds
+        METRICS.observe('translation.request', seconds)
+        METRICS.inc('translation.strings', strings)
+
+    def save(self):
+        """Write the cache atomically so an interrupted save never corrupts it."""
+        with self._lock:
+            data = dict(self._load())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        """
+        Hit rate plus the API time the hits are estimated to have saved.
 
-        Return ONLY the translated JSON object, no additional text or explanation.
+        Lookups deduplicated within the run count toward neither the hits nor the time saved.
         """
+        with self._lock:
+            lookups = self.hits + self.misses + self.deduplicated
+            seconds_per_string = self.api_seconds / self.api_strings if self.api_strings else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'deduplicated': self.deduplicated,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'api_calls': self.api_calls,
+                'api_seconds': self.api_seconds,
+                'estimated_seconds_saved': self.hits * seconds_per_string
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses, "
+                     f"{stats['deduplicated']} deduplicated in this run "
+                     f"({stats['hit_rate']:.0%} hit rate), {stats['api_calls']} API calls, "
+                     f"~{stats['estimated_seconds_saved']:.1f}s of API latency saved")
+
+translation_cache = TranslationCache()
+
+class PendingTranslations:
+    """Strings being translated right now, shared by threads so each string is only sent once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+
+    def claim(self, strings: list[str], cache: TranslationCache) -> tuple[list[str], list[threading.Event]]:
+        """
+        Split strings missing from the cache into the ones the caller has to send
+        and events for the ones another thread is already sending.
+
+        Call done() with the first list once they are translated or have failed.
+        """
+        claimed = []
+        in_flight = []
+        with self._lock:
+            for text in strings:
+                if text in self._events:
+                    in_flight.append(self._events[text])
+                elif cache.get(text) is None:  # done() only runs after the cache has the translation
+                    self._events[text] = threading.Event()
+                    claimed.append(text)
+        return claimed, in_flight
+
+    def done(self, strings: list[str]):
+        with self._lock:
+            for text in strings:
+                self._events.pop(text).set()
+
+def product_strings(product: dict) -> list[str]:
+    """The text fields of a product that need translating."""
+    return [product[field] for field in TRANSLATED_FIELDS if product.get(field)]
+
+def create_completion_with_backoff(**kwargs):
+    """Call the chat completions API, backing off exponentially on 429s and transient errors."""
+    for attempt in range(MAX_API_RETRIES + 1):
+        try:
+            return get_openai_client().chat.completions.create(**kwargs)
+        except RETRYABLE_API_ERRORS as e:
+            if attempt >= MAX_API_RETRIES:
+                raise
+            retry_after = None
+            response = getattr(e, 'response', None)
+            if response is not None:
+                retry_after = response.headers.get('retry-after')
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = (2 ** attempt) * (0.5 + random.random())
+            logging.warning(f"Translation request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            METRICS.inc('translation.retries')
+            METRICS.observe('wait.translation_backoff', delay)
+            time.sleep(delay)
+
+def request_translations(strings: list[str], cache: TranslationCache, max_tokens: int = 500) -> dict[str, str]:
+    """Translate a list of French strings in one API call, raising if the response can't be parsed."""
+    # Number the strings so the answer can be mapped back by ID rather than by order
+    source = {str(i): text for i, text in enumerate(strings)}
+    prompt = f"""
+    Translate each value of the following JSON object from French to English.
+    These are e-commerce product names and packaging types. Keep numbers, sizes and
+    product codes exactly as they are.
+
+    {json.dumps(source, indent=2, ensure_ascii=False)}
+
+    Return ONLY a JSON object with the same keys and the English translations as values, no additional text or explanation.
+    """
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a professional translator specializing in e-commerce product descriptions."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,  # Low temperature for consistent output
-            max_tokens=500
-        )
+    started = time.monotonic()
+    response = create_completion_with_backoff(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a professional translator specializing in e-commerce product descriptions."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,  # Low temperature for consistent output
+        max_tokens=max_tokens
+    )
+    cache.record_api_call(time.monotonic() - started, len(strings))
 
-        # Parse the response and convert back to dict
-        translated_product = json.loads(response.choices[0].message.content.strip())
-        result_queue.put((product, translated_product))
+    # Parse the response and map the translations back to their source strings
+    translated = json.loads(response.choices[0].message.content.strip())
+    translations = {}
+    for key, text in source.items():
+        if isinstance(translated.get(key), str):
+            translations[text] = translated[key]
+            cache.put(text, translated[key])
+    return translations
 
+def translate_strings(strings: list[str], cache: TranslationCache | None = None) -> dict[str, str]:
+    """Translate a list of French strings in one API call and store the results in the cache."""
+    cache = cache or translation_cache
+    if not strings:
+        return {}
+    try:
+        return request_translations(strings, cache)
     except Exception as e:
-        logging.error(f"Error translating product: {str(e)}")
-        result_queue.put((product, product))  # Return original if translation fails
+        logging.error(f"Error translating strings: {str(e)}")
+        return {}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for French/English product text (about 3 characters per token)."""
+    return len(text) // 3 + 1
+
+def completion_budget(strings: list[str]) -> int:
+    """max_tokens for translating these strings: translations run a little longer than the source, plus JSON overhead."""
+    return sum(int(estimate_tokens(text) * 1.5) + TOKENS_PER_ITEM for text in strings) + 20
+
+def plan_batches(strings: list[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_output_tokens: int = MAX_OUTPUT_TOKENS) -> list[list[str]]:
+    """Pack strings into batches of at most batch_size whose estimated output fits max_output_tokens."""
+    batches = []
+    batch = []
+    for text in strings:
+        if batch and (len(batch) >= batch_size or completion_budget(batch + [text]) > max_output_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def translate_batch(strings: list[str], cache: TranslationCache | None = None,
+                    max_output_tokens: int = MAX_OUTPUT_TOKENS) -> dict[str, str]:
+    """
+    Translate a batch of strings in one call, splitting and retrying the part that failed.
+
+    A truncated or malformed response, or missing IDs, sends the failed strings
+    back as two smaller batches, so one bad item only ever costs itself. An
+    API failure that outlasted create_completion_with_backoff's retries fails
+    the whole batch at once: smaller requests wouldn't get through either.
+    """
+    cache = cache or translation_cache
+    if not strings:
+        return {}
+    try:
+        translations = request_translations(strings, cache, min(completion_budget(strings), max_output_tokens))
+    except openai.OpenAIError as e:
+        if not isinstance(e, openai.BadRequestError):
+            logging.error(f"Translation batch of {len(strings)} strings failed ({type(e).__name__}: {str(e)}), "
+                          f"keeping the originals")
+            return {}
+        logging.warning(f"Translation batch of {len(strings)} strings rejected: {str(e)}")
+        translations = {}
+    except Exception as e:
+        logging.warning(f"Translation batch of {len(strings)} strings failed: {str(e)}")
+        translations = {}
+
+    failed = [text for text in strings if text not in translations]
+    if failed and len(strings) == 1:
+        logging.error(f"Giving up translating {strings[0]!r}, keeping the original")
+    elif failed:
+        middle = (len(failed) + 1) // 2
+        for half in (failed[:middle], failed[middle:]):
+            translations.update(translate_batch(half, cache, max_output_tokens))
+    return translations
+
+def apply_translations(product: dict, cache: TranslationCache | None = None) -> dict:
+    """
+    Replace the product's text fields with their cached translations, in place.
+
+    The product is updated rather than copied so large catalogues aren't held
+    twice; repeated translations share the cache's string objects.
+    """
+    cache = cache or translation_cache
+    for field in TRANSLATED_FIELDS:
+        if product.get(field):
+            product[field] = cache.get(product[field]) or product[field]
+    return product
+
+def translate_product(product: dict, cache: TranslationCache | None = None,
+                      pending: PendingTranslations | None = None) -> dict:
+    """
+    Translate a single product to English, only sending strings the cache hasn't seen.
+
+    Threads sharing pending wait for each other's requests instead of sending
+    the same new string twice.
+    """
+    cache = cache or translation_cache
+    strings = product_strings(product)
+    hits = 0
+    missing = []
+    for text in strings:
+        if cache.get(text) is not None:
+            hits += 1
+            cache.record_lookup(True)
+        elif text not in missing:
+            missing.append(text)
+
+    to_send, in_flight = pending.claim(missing, cache) if pending else (missing, [])
+    for _ in to_send:
+        cache.record_lookup(False)
+    # Repeats within the product, and strings another thread sent or is sending
+    if len(strings) - hits - len(to_send):
+        cache.record_deduplicated(len(strings) - hits - len(to_send))
+    try:
+        translate_strings(to_send, cache)
+    finally:
+        if pending:
+            pending.done(to_send)
+    for event in in_flight:
+        event.wait()
+    return apply_translations(product, cache)  # Untranslated fields keep the original text
+
+def iter_translated_products(products: List[Dict], cache: TranslationCache | None = None,
+                             batch_size: int | None = DEFAULT_BATCH_SIZE,
+                             max_workers: int = DEFAULT_TRANSLATE_WORKERS) -> Iterator[tuple[int, Dict]]:
+    """
+    Translate products on a bounded thread pool, yielding (index, translated_product) as each one completes.
+
+    Each unseen string is sent once: packed batch_size at a time into one
+    request, or with batch_size=None, together with the first product it
+    appears in. A product is yielded as soon as every request carrying one of
+    its strings has finished; fully cached products are yielded straight away.
+    """
+    cache = cache or translation_cache
+
+    # Give each unseen string to the first product it appears in, so duplicates
+    # across the catalogue are never sent to the API twice
+    pending = set()
+    strings_per_product = []
+    unseen_per_product = []
+    for product in products:
+        strings = []
+        unseen = []
+        for text in product_strings(product):
+            if text in pending:
+                # Already going out with an earlier product's request
+                cache.record_deduplicated()
+                unseen.append(text)
+                continue
+            hit = cache.get(text) is not None
+            cache.record_lookup(hit)
+            if not hit:
+                pending.add(text)
+                strings.append(text)
+                unseen.append(text)
+        strings_per_product.append(strings)
+        unseen_per_product.append(unseen)
+
+    if batch_size:
+        unseen_strings = [text for strings in strings_per_product for text in strings]
+        jobs = [(translate_batch, batch) for batch in plan_batches(unseen_strings, batch_size)]
+        logging.info(f"Sending {len(unseen_strings)} unseen strings in {len(jobs)} batches")
+    else:
+        jobs = [(translate_strings, strings) for strings in strings_per_product if strings]
+
+    # Work out which requests each product is waiting on
+    job_for_string = {text: job_index for job_index, (_, strings) in enumerate(jobs) for text in strings}
+    waiting_on = [{job_for_string[text] for text in unseen} for unseen in unseen_per_product]
+    products_for_job = [[] for _ in jobs]
+    for index, job_indices in enumerate(waiting_on):
+        for job_index in job_indices:
+            products_for_job[job_index].append(index)
+
+    for index, job_indices in enumerate(waiting_on):
+        if not job_indices:
+            yield index, apply_translations(products[index], cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(target, strings, cache): job_index for job_index, (target, strings) in enumerate(jobs)}
+        for future in as_completed(futures):
+            job_index = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error translating strings: {str(e)}")  # Affected fields keep the original text
+            for index in products_for_job[job_index]:
+                waiting_on[index].discard(job_index)
+                if not waiting_on[index]:
+                    yield index, apply_translations(products[index], cache)
+
+def translate_products_to_english(products: List[Dict], cache: TranslationCache | None = None,
+                                  batch_size: int | None = DEFAULT_BATCH_SIZE,
+                                  max_workers: int = DEFAULT_TRANSLATE_WORKERS) -> List[Dict]:
+    """Translate all products to English on a bounded thread pool, keeping the input order."""
+    cache = cache or translation_cache
+    logging.info(f"Translating products to English with {max_workers} workers...")
 
-def translate_products_to_english(products: List[Dict]) -> List[Dict]:
-    """Translate all products to English using multiple threads."""
-    logging.info("Translating products to English using parallel processing...")
-    
-    # Create a queue to collect results
-    result_queue = Queue()
-    threads = []
     translated_products = [None] * len(products)  # Pre-allocate list
-    
-    # Create and start threads
-    for i, product in enumerate(products):
-        thread = threading.Thread(
-            target=translate_product_to_english,
-            args=(product, result_queue)
-        )
-        thread.start()
-        threads.append(thread)
-        
-        # Add a small delay between thread starts to avoid rate limits
-        time.sleep(0.5)
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-    
-    # Collect results from queue
-    while not result_queue.empty():
-        original_product, translated_product = result_queue.get()
-        # Find the index of the original product
-        idx = products.index(original_product)
-        translated_products[idx] = translated_product
+    for index, translated_product in iter_translated_products(products, cache, batch_size, max_workers):
+        translated_products[index] = translated_product
+
+    cache.save()
+    cache.log_stats()
     
     # Log completion
     logging.info(f"Completed translation of {len(translated_products)} products")
-    return translated_products
\ No newline at end of file
+    return translated_products
@@ -0,0 +1,270 @@
+"""Crawl frontier: find every product listing page on the site and scrape them all with concurrent workers."""
+import heapq
+import itertools
+import logging
+import re
+import threading
+from queue import Queue
+from typing import Iterator
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from fetching import DEFAULT_MAX_DEPTH, DEFAULT_REQUESTS_PER_SECOND, polite_get
+from incremental import product_id_from_url
+from metrics import METRICS
+from pagination import detect_page_pattern
+from parse_pool import run_parser
+from parsing import parse_crawl_page
+from product_record import ProductRecord
+from rate_limiter import HostRateLimiter
+
+# Lower values are crawled first: pagination of a listing, then links found on listings, then everything else
+PRIORITY_PAGINATION = 0
+PRIORITY_LISTING_LINK = 1
+PRIORITY_OTHER = 2
+
+# Query parameters that only re-sort or filter a listing, e.g. ?order=product.price.asc&resultsPerPage=48
+IGNORED_QUERY_PARAMS = {'order', 'q', 'resultsPerPage', 'utm_source', 'utm_medium', 'utm_campaign'}
+
+# Pages that are never listings, or that would log the session out
+SKIPPED_URL_PATTERN = re.compile(
+    r'mylogout|/connexion|/panier|/commande|/mon-compte|/recuperation-mot-de-passe'
+    r'|\.(?:css|js|jpe?g|png|gif|svg|webp|ico|pdf|zip|xml)$',
+    re.IGNORECASE
+)
+
+_CRAWL_DONE = object()
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalise a URL for the seen-set: lowercase scheme and host, drop the fragment,
+    sorting/filter parameters and ?page=1, and sort the remaining query.
+    e.g. https://Pali.plus/produits?page=1&order=x#top -> https://pali.plus/produits
+    """
+    parts = urlsplit(url)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in IGNORED_QUERY_PARAMS and (key, value) != ('page', '1'))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def is_product_page(url: str) -> bool:
+    """Detail pages end in .html and carry a product ID, e.g. /produits/914-porte-manteau-1m68cm.html."""
+    return urlsplit(url).path.endswith('.html') and product_id_from_url(url) is not None
+
+
+class CrawlFrontier:
+    """
+    Thread-safe priority queue of URLs to visit, with a seen-set over canonical URLs.
+
+    Only URLs on allowed_hosts and at most max_depth links from the start are
+    accepted. get() blocks while other workers may still add URLs and returns
+    None once the frontier is exhausted or closed.
+    """
+
+    def __init__(self, allowed_hosts: set[str], max_depth: int = DEFAULT_MAX_DEPTH):
+        self.allowed_hosts = {host.lower() for host in allowed_hosts}
+        self.max_depth = max_depth
+        self._heap = []
+        self._seen = set()
+        self._order = itertools.count()  # keeps equal priorities first-in first-out
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def add(self, url: str, depth: int, priority: int = PRIORITY_OTHER) -> bool:
+        """Queue a URL unless it was seen before or is out of bounds; return whether it was queued."""
+        if depth > self.max_depth or SKIPPED_URL_PATTERN.search(url) or is_product_page(url):
+            return False
+        key = canonical_url(url)
+        if urlsplit(key).netloc not in self.allowed_hosts:
+            return False
+        with self._condition:
+            if self._closed or key in self._seen:
+                return False
+            self._seen.add(key)
+            heapq.heappush(self._heap, (priority, depth, next(self._order), url))
+            self._condition.notify()
+        return True
+
+    def mark_seen(self, url: str):
+        """Record a URL reached another way, e.g. the final URL after a redirect."""
+        with self._condition:
+            self._seen.add(canonical_url(url))
+
+    def get(self) -> tuple[str, int] | None:
+        """Take the most promising URL and its depth; call task_done() after crawling it."""
+        with self._condition:
+            while not self._heap and self._in_flight and not self._closed:
+                self._condition.wait()
+            if self._closed or not self._heap:
+                self._condition.notify_all()
+                return None
+            _, depth, _, url = heapq.heappop(self._heap)
+            self._in_flight += 1
+            return url, depth
+
+    def task_done(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop handing out URLs; pages already being crawled still finish."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+
+def crawl_site(session: requests.Session, start_url: str, max_pages: int = 999, max_depth: int = DEFAULT_MAX_DEPTH,
+               max_workers: int = 4, rate_limiter: HostRateLimiter | None = None,
+               allowed_hosts: set[str] | None = None, prefetch: int = 0,
+               status: dict | None = None, listing_urls: list[str] | None = None) -> Iterator[ProductRecord]:
+    """
+    Crawl the site from start_url and yield the products of every listing page found.
+
+    A listing page is any page with article.product-miniature elements; its
+    pagination is followed without counting toward max_depth. Products listed
+    in several categories are yielded once, keyed by the product ID in their
+    detail URL. Crawling stops being scheduled after max_pages listing pages.
+    With prefetch, the next pages of a listing are queued as soon as the page
+    number pattern of its pagination is known, e.g. ?page=3 and ?page=4 after
+    ?page=1 -> ?page=2, so workers can fetch them before the links are found,
+    without going past the last page linked from the pagination nav. Listing
+    pages that finish after max_pages was reached are dropped.
+    status, if given, gets status['complete'] = True when every reachable page
+    was crawled: no page failed and max_pages didn't cut the crawl short, and
+    status['listing_urls'], the first page of every listing found.
+    Known listing_urls, e.g. the ones a previous crawl found, replace crawling
+    from start_url: only their pagination is followed.
+    """
+    if rate_limiter is None:
+        rate_limiter = HostRateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+    frontier = CrawlFrontier(allowed_hosts or {urlsplit(start_url).netloc}, 0 if listing_urls else max_depth)
+    for url in listing_urls or [start_url]:
+        frontier.add(url, 0, PRIORITY_LISTING_LINK)
+    results = Queue()
+    seen_products = set()
+    counts = {'pages': 0, 'listing_pages': 0, 'products': 0, 'duplicates': 0, 'errors': 0, 'dropped': 0}
+    # (prefix, suffix) of each listing's page pattern -> highest page number its pagination nav links to
+    last_pages = {}
+    # Listing pages in crawl order, and the canonical URLs that are another listing page's next page
+    listing_pages = []
+    paginated = set()
+    lock = threading.Lock()
+
+    def crawl_page(url: str, depth: int):
+        response, _ = polite_get(session, url, rate_limiter)
+        if 400 <= response.status_code < 500:
+            # Dead links are normal while crawling; count them instead of logging each one
+            logging.debug(f"Skipping {url}: HTTP {response.status_code}")
+            METRICS.inc('crawl.dead_links')
+            return
+        response.raise_for_status()
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return
+        if response.url != url:
+            # Redirected, e.g. to the login page; don't crawl off-site or revisit the target
+            if (urlsplit(response.url).netloc.lower() not in frontier.allowed_hosts
+                    or SKIPPED_URL_PATTERN.search(response.url)):
+                return
+            frontier.mark_seen(response.url)
+
+        products, next_url, links = run_parser(parse_crawl_page, response, response.url)
+        with lock:
+            counts['pages'] += 1
+            if products:
+                if counts['listing_pages'] >= max_pages:
+                    # The page budget was spent while this page was in flight
+                    counts['dropped'] += 1
+                    return
+                counts['listing_pages'] += 1
+                listing_pages.append(url)
+                if counts['listing_pages'] >= max_pages:
+                    frontier.close()
+            new_products = []
+            for product in products:
+                key = product_id_from_url(product['detail_url']) or product['detail_url'] or product['name']
+                if key in seen_products:
+                    counts['duplicates'] += 1
+                    continue
+                seen_products.add(key)
+                new_products.append(product)
+            counts['products'] += len(new_products)
+        METRICS.inc('crawl.pages')
+        if products:
+            METRICS.inc('listing.pages')
+            METRICS.inc('listing.products', len(new_products))
+            logging.debug(f"Found {len(products)} products ({len(new_products)} new) on {url}")
+        for product in new_products:
+            results.put(product)
+
+        if next_url:
+            with lock:
+                paginated.add(canonical_url(next_url))
+            frontier.add(next_url, depth, PRIORITY_PAGINATION)
+            pattern = detect_page_pattern(response.url, next_url) if prefetch else None
+            if pattern:
+                next_page = pattern.page_of(next_url)
+                # A nav that only links the next page says nothing about where the listing ends
+                linked_page = pattern.last_page(response.text, response.url)
+                with lock:
+                    if linked_page and linked_page > next_page:
+                        last_pages[pattern.prefix, pattern.suffix] = max(
+                            last_pages.get((pattern.prefix, pattern.suffix), 0), linked_page)
+                    last_page = last_pages.get((pattern.prefix, pattern.suffix))
+                stop = next_page + prefetch if last_page is None else min(next_page + prefetch, last_page)
+                for page in range(next_page + 1, stop + 1):
+                    with lock:
+                        paginated.add(canonical_url(pattern.url_for(page)))
+                    frontier.add(pattern.url_for(page), depth, PRIORITY_PAGINATION)
+        link_priority = PRIORITY_LISTING_LINK if products else PRIORITY_OTHER
+        for link in links:
+            frontier.add(link, depth + 1, link_priority)
+
+    def worker():
+        while (task := frontier.get()) is not None:
+            url, depth = task
+            try:
+                crawl_page(url, depth)
+            except requests.exceptions.RequestException as e:
+                with lock:
+                    counts['errors'] += 1
+                logging.warning(f"Network error while crawling {url}: {str(e)}")
+            except Exception as e:
+                with lock:
+                    counts['errors'] += 1
+                logging.error(f"Error crawling {url}: {str(e)}")
+            finally:
+                frontier.task_done()
+
+    if listing_urls:
+        logging.info(f"Crawling {len(listing_urls)} known listings ({max_workers} workers)")
+    else:
+        logging.info(f"Crawling {start_url} for listing pages (depth {max_depth}, {max_workers} workers)")
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+    for thread in workers:
+        thread.start()
+
+    def close_when_done():
+        for thread in workers:
+            thread.join()
+        results.put(_CRAWL_DONE)
+
+    threading.Thread(target=close_when_done, daemon=True).start()
+    while (product := results.get()) is not _CRAWL_DONE:
+        yield product
+
+    METRICS.inc('crawl.duplicates', counts['duplicates'])
+    METRICS.inc('crawl.dropped_pages', counts['dropped'])
+    if status is not None:
+        status['complete'] = not counts['errors'] and counts['listing_pages'] < max_pages
+        status['listing_urls'] = [url for url in listing_pages if canonical_url(url) not in paginated]
+    logging.info(f"Crawled {counts['pages']} pages: {counts['products']} unique products on "
+                 f"{counts['listing_pages']} listing pages ({counts['duplicates']} duplicates skipped)")
@@ -0,0 +1,183 @@
+"""Persistent on-disk HTTP cache with ETag / Last-Modified revalidation for requests sessions."""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urldefrag
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers that describe the transfer rather than the content and must not be replayed
+SKIPPED_HEADERS = {'set-cookie', 'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+# Expired entries are swept every this many stores; the size budget is checked on every store
+EVICT_EVERY = 256
+
+
+def normalise_url(url: str) -> str:
+    """Cache key for a URL: drop the fragment, e.g. '#/31-quantite-cartons'."""
+    return urldefrag(url)[0]
+
+
+class HttpCache:
+    """
+    SQLite store of zlib-compressed response bodies, evicted by TTL and total size.
+
+    The total size is kept as a running count, so a store only scans the table
+    when the budget is exceeded or every EVICT_EVERY stores to sweep expired entries.
+    """
+
+    def __init__(self, path: str = '.http_cache.sqlite', max_bytes: int = 500 * 1024 * 1024,
+                 ttl: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._stores = 0
+
+    def get(self, url: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT headers, body, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (normalise_url(url),)
+            ).fetchone()
+        if row is None or time.time() - row[4] > self.ttl:
+            return None
+        return {'headers': json.loads(row[0]), 'body': row[1], 'etag': row[2], 'last_modified': row[3]}
+
+    def body(self, entry: dict) -> bytes:
+        return zlib.decompress(entry['body'])
+
+    def store(self, url: str, response: requests.Response):
+        """Store a 200 response that carries a validator we can revalidate with later."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS}
+        body = zlib.compress(response.content)
+        now = time.time()
+        with self._lock:
+            replaced = self._db.execute("SELECT size FROM responses WHERE url = ?", (normalise_url(url),)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (normalise_url(url), json.dumps(headers), body, etag, last_modified, now, now, len(body))
+            )
+            self._db.commit()
+            self._total += len(body) - (replaced[0] if replaced else 0)
+            self._stores += 1
+            due = self._total > self.max_bytes or self._stores % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def record_lookup(self, hit: bool):
+        """Count a revalidated (hit) or downloaded (miss) response."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def touch(self, url: str):
+        with self._lock:
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), normalise_url(url)))
+            self._db.commit()
+
+    def evict(self):
+        """Drop entries older than the TTL, then the least recently used until under the size budget."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+                for url, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                    total -= size
+            self._db.commit()
+            self._total = total
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter that revalidates cached GETs with If-None-Match / If-Modified-Since."""
+
+    def __init__(self, cache: HttpCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.get(request.url)
+        if entry:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            response.close()
+            self.cache.record_lookup(True)
+            self.cache.touch(request.url)
+            return self._cached_response(request, entry)
+
+        self.cache.record_lookup(False)
+        if response.status_code == 200:
+            self.cache.store(request.url, response)
+        return response
+
+    def _cached_response(self, request, entry: dict) -> Response:
+        """Build a 200 response from a cache entry confirmed fresh by the server."""
+        response = Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers['X-Cache'] = 'revalidated'
+        response._content = self.cache.body(entry)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+def install_http_cache(session: requests.Session, path: str = '.http_cache.sqlite', max_bytes: int = 500 * 1024 * 1024,
+                       ttl: float = 30 * 24 * 3600) -> HttpCache:
+    """Mount a CachingAdapter on the session for both http and https, return the cache."""
+    cache = HttpCache(path, max_bytes, ttl)
+    adapter = CachingAdapter(cache)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logging.info(f"HTTP cache enabled at {path} ({max_bytes // (1024 * 1024)} MB budget)")
+    return cache
@@ -0,0 +1,115 @@
+"""Incremental re-scrape support: compare a fresh listing against the last snapshot."""
+import json
+import logging
+import re
+from urllib.parse import urldefrag, urlsplit
+
+# Product ID (and combination ID, when the product has one) at the start of the detail page slug
+# e.g. https://pali.plus/produits/2516-3425-cadena-a-cle-couleur-40mm-8445542003157.html -> 2516-3425
+#      https://pali.plus/produits/914-porte-manteau-1m68cm.html -> 914
+PRODUCT_ID_PATTERN = re.compile(r'/(\d+(?:-\d+)?)-[^/]*$')
+
+# Listing fields that mark a product as changed when they differ from the snapshot
+COMPARED_FIELDS = ('name', 'price_per_unit', 'price_per_carton')
+
+
+def product_id_from_url(detail_url: str | None) -> str | None:
+    """Parse the product ID (e.g. '2516-3425') from a detail URL slug."""
+    if not detail_url:
+        return None
+    match = PRODUCT_ID_PATTERN.search(urlsplit(urldefrag(detail_url)[0]).path)
+    return match.group(1) if match else None
+
+
+def _compared_value(product, field: str):
+    """Prices compare as numbers, so a snapshot with '13.20' matches a fresh 13.2."""
+    value = product.get(field)
+    if field.startswith('price_') and value not in (None, ''):
+        try:
+            return float(str(value).replace(',', '.'))
+        except ValueError:
+            pass
+    return value
+
+
+def load_snapshot(path: str) -> dict[str, dict]:
+    """Load a previous product_data.json and index it by product ID."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            products = json.load(f)
+    except FileNotFoundError:
+        logging.warning(f"No previous snapshot at {path}, every product will be treated as new")
+        return {}
+
+    index = {}
+    for product in products:
+        product_id = product_id_from_url(product.get('detail_url'))
+        if product_id:
+            index[product_id] = product
+    logging.info(f"Loaded {len(index)} products from snapshot {path}")
+    return index
+
+
+def save_snapshot(products: list[dict], path: str):
+    """Write products in the same pretty-printed format as product_data.json."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(products, f, indent=2, ensure_ascii=False, default=dict)
+
+
+def diff_products(products: list[dict], previous: dict[str, dict], complete: bool = True) -> dict[str, list[dict]]:
+    """
+    Split a fresh listing into added, changed, unchanged and removed products.
+
+    Unchanged products get their barcode copied from the snapshot, so only the
+    added and changed ones need their detail page fetched. A crawl that didn't
+    reach the last listing page (complete=False) can't tell a removed product
+    from one it never got to, so nothing is reported as removed.
+    """
+    delta = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+    seen_ids = set()
+
+    for product in products:
+        product_id = product_id_from_url(product['detail_url'])
+        old_product = previous.get(product_id) if product_id else None
+        if product_id:
+            seen_ids.add(product_id)
+
+        if old_product is None:
+            delta['added'].append(product)
+        elif any(_compared_value(product, field) != _compared_value(old_product, field) for field in COMPARED_FIELDS) \
+                or not old_product.get('barcode'):
+            delta['changed'].append(product)
+        else:
+            product['barcode'] = old_product['barcode']
+            delta['unchanged'].append(product)
+
+    if complete:
+        delta['removed'] = [product for product_id, product in previous.items() if product_id not in seen_ids]
+    logging.info(f"Incremental diff: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+                 f"{len(delta['unchanged'])} unchanged, {len(delta['removed'])} removed")
+    return delta
+
+
+def merge_snapshot(products: list[dict], previous: dict[str, dict]) -> list[dict]:
+    """
+    The snapshot after a partial crawl: previous products updated with the crawled ones.
+
+    Products the crawl didn't reach are kept, in their old order; new products follow.
+    """
+    fresh = {}
+    unkeyed = []
+    for product in products:
+        product_id = product_id_from_url(product['detail_url'])
+        if product_id:
+            fresh[product_id] = product
+        else:
+            unkeyed.append(product)
+    merged = [fresh.pop(product_id, product) for product_id, product in previous.items()]
+    return merged + list(fresh.values()) + unkeyed
+
+
+def write_delta(delta: dict[str, list[dict]], path: str):
+    """Write the added / changed / removed products of a run as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({key: delta[key] for key in ('added', 'changed', 'removed')}, f, indent=2, ensure_ascii=False,
+                  default=dict)
@@ -0,0 +1,169 @@
+"""Lightweight counters and histograms for the scraper's hot paths, with JSON / Prometheus export."""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import requests
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are estimated as the upper bound of the bucket they fall in."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.50),
+            'p99': self.quantile(0.99),
+            'max': self.max
+        }
+
+
+class Metrics:
+    """Thread-safe registry of named counters, gauges and histograms, e.g. 'http.request' or 'parse.detail'."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Record the current value of something that goes up and down, e.g. the allowed request rate."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the enclosed block into the `name` histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'wall_seconds': time.monotonic() - self.started,
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'histograms': {name: histogram.summary() for name, histogram in self._histograms.items()}
+            }
+
+    def log_summary(self):
+        """Log where the run's time went: every timed stage and hot path, largest total first."""
+        summary = self.summary()
+        logging.info(f"Run summary ({summary['wall_seconds']:.1f}s wall clock):")
+        histograms = sorted(summary['histograms'].items(), key=lambda item: item[1]['total'], reverse=True)
+        for name, h in histograms:
+            logging.info(f"  {name:<24} total {h['total']:>9.2f}s  count {h['count']:>7}  "
+                         f"p50 {h['p50'] * 1000:>8.1f}ms  p99 {h['p99'] * 1000:>8.1f}ms")
+        for name, value in sorted(summary['counters'].items()):
+            logging.info(f"  {name:<24} {value:,.0f}")
+        for name, value in sorted(summary['gauges'].items()):
+            logging.info(f"  {name:<24} {value:,.2f}")
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path: str, prefix: str = 'scraper'):
+        """Write the metrics in the Prometheus text exposition format (for the node_exporter textfile collector)."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {name: (h.buckets, list(h.counts), h.count, h.total) for name, h in self._histograms.items()}
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric = f"{prefix}_{name.replace('.', '_')}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in sorted(gauges.items()):
+            metric = f"{prefix}_{name.replace('.', '_')}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        for name, (buckets, counts, count, total) in sorted(histograms.items()):
+            metric = f"{prefix}_{name.replace('.', '_')}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f'{metric}_bucket{{le="+Inf"}} {count}', f"{metric}_sum {total}", f"{metric}_count {count}"]
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def write(self, path: str):
+        """Write JSON, or Prometheus text when the path ends in .prom."""
+        if path.endswith('.prom'):
+            self.write_prometheus(path)
+        else:
+            self.write_json(path)
+        logging.info(f"Wrote run metrics to {path}")
+
+
+# Process-wide registry used by the scraper and translator
+METRICS = Metrics()
+
+
+def instrument_session(session: requests.Session, metrics: Metrics = METRICS) -> requests.Session:
+    """Record time-to-headers, bytes downloaded and errors for every response the session receives."""
+    def record_response(response, *args, **kwargs):
+        metrics.observe('http.request', response.elapsed.total_seconds())
+        metrics.inc('http.requests')
+        metrics.inc('http.bytes', len(response.content))
+        if response.status_code >= 400:
+            metrics.inc('http.errors')
+        return response
+
+    session.hooks['response'].append(record_response)
+    return session
@@ -0,0 +1,63 @@
+"""Pagination patterns: predict the URLs of the next listing pages so they can be fetched ahead of time."""
+import html
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Digits in a URL that may be the page number, e.g. https://pali.plus/produits?page=2 -> 2
+NUMBER_PATTERN = re.compile(r'\d+')
+
+# Query parameter name right before a page number, e.g. ...?order=x&page= -> page
+QUERY_KEY_PATTERN = re.compile(r'[?&]([^=&?#]+)=$')
+
+HREF_PATTERN = re.compile(r'href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+class PagePattern:
+    """Listing URLs that only differ in their page number, e.g. https://pali.plus/produits?page={n}."""
+
+    def __init__(self, prefix: str, suffix: str):
+        self.prefix = prefix
+        self.suffix = suffix
+        self._regex = re.compile(re.escape(prefix) + r'(\d+)' + re.escape(suffix))
+
+    def __repr__(self):
+        return f"PagePattern({self.prefix}{{n}}{self.suffix})"
+
+    def url_for(self, page: int) -> str:
+        return f"{self.prefix}{page}{self.suffix}"
+
+    def page_of(self, url: str) -> int | None:
+        """The page number of url, or None if it doesn't follow the pattern."""
+        match = self._regex.fullmatch(url)
+        return int(match.group(1)) if match else None
+
+    def last_page(self, page_html: str, page_url: str) -> int | None:
+        """Highest page number linked from a listing page, e.g. from the numbered links of its pagination nav."""
+        pages = [self.page_of(urljoin(page_url, html.unescape(href))) for href in HREF_PATTERN.findall(page_html)]
+        return max((page for page in pages if page is not None), default=None)
+
+
+def _without_param(url: str, key: str | None = None) -> str:
+    """url with the query parameter key removed, e.g. /produits?page=2 -> /produits."""
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name != key]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def detect_page_pattern(url: str, next_url: str) -> PagePattern | None:
+    """
+    Find the page number in next_url, given that it is the page after url.
+
+    url may be numbered too (/produits?page=1 -> /produits?page=2, /produits/page/3 ->
+    /produits/page/4) or be the unnumbered first page (/produits -> /produits?page=2).
+    Returns None when next_url doesn't look like the next page of url, e.g. a cursor token.
+    """
+    for match in reversed(list(NUMBER_PATTERN.finditer(next_url))):
+        page = int(match.group())
+        pattern = PagePattern(next_url[:match.start()], next_url[match.end():])
+        if page > 1 and pattern.url_for(page - 1) == url:
+            return pattern
+        key = QUERY_KEY_PATTERN.search(pattern.prefix)
+        if page == 2 and key and _without_param(next_url, key.group(1)) == _without_param(url):
+            return pattern
+    return None
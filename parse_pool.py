@@ -0,0 +1,73 @@
+"""Process pool for the CPU-bound parse/extract stage, so page parsing isn't limited to one core by the GIL."""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import METRICS
+
+# The running pool, if any; start_parse_pool() replaces it
+_pool = None
+
+
+def decode_and_parse(function, content: bytes, encoding: str | None, *args):
+    """Decode a response body the way requests does and run function(html, *args) on it."""
+    return function(content.decode(encoding or 'utf-8', errors='replace'), *args)
+
+
+class ParsePool:
+    """
+    Worker processes that run the listing and detail extractors on raw page bytes.
+
+    The fetching threads keep doing the I/O: they hand the response body to
+    parse() and block on the small result (product records, a barcode) while
+    a worker process builds the tree, so parsing uses every core instead of
+    contending for the GIL. initializer runs once in each worker, e.g. to
+    select the same parser backend as this process.
+    """
+
+    def __init__(self, processes: int, initializer=None, initargs: tuple = ()):
+        self.processes = processes
+        # spawn, not fork: the parent is full of threads holding locks
+        self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=initializer, initargs=initargs)
+
+    def submit(self, function, content: bytes, encoding: str | None = None, *args):
+        """Queue function(html, *args) on a worker process and return its future."""
+        return self._executor.submit(decode_and_parse, function, content, encoding, *args)
+
+    def parse(self, function, content: bytes, encoding: str | None = None, *args):
+        """Run function(html, *args) on a worker process and wait for the result."""
+        return self.submit(function, content, encoding, *args).result()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+def start_parse_pool(processes: int, initializer=None, initargs: tuple = ()) -> ParsePool:
+    """Parse pages in `processes` worker processes from now on, see run_parser."""
+    global _pool
+    stop_parse_pool()
+    _pool = ParsePool(processes, initializer, initargs)
+    logging.info(f"Parsing pages in {processes} worker processes")
+    return _pool
+
+
+def stop_parse_pool():
+    """Shut the pool down; pages are parsed on the fetching threads again."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def run_parser(function, response, *args):
+    """
+    Run function(html, *args) on a response's page, in the parse pool when one is running.
+
+    function must be a module-level function so worker processes can import it,
+    e.g. run_parser(parse_listing_page, response).
+    """
+    if _pool is None:
+        return function(response.text, *args)
+    with METRICS.timer('parse.pool'):
+        return _pool.parse(function, response.content, response.encoding, *args)
@@ -0,0 +1,253 @@
+"""Listing and detail page extraction, and the parser backend it uses."""
+import logging
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from metrics import METRICS
+from product_record import ProductRecord
+
+try:
+    import lxml  # noqa: F401 - only needed as a BeautifulSoup tree builder
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser  # selectolax < 0.3.13
+    except ImportError:
+        SelectolaxParser = None
+
+
+# BeautifulSoup tree builder, and the backend used for listing and detail pages ('selectolax', 'lxml' or 'html.parser')
+SOUP_PARSER = 'lxml' if LXML_AVAILABLE else 'html.parser'
+PARSER_BACKEND = 'selectolax' if SelectolaxParser else SOUP_PARSER
+
+
+def set_parser_backend(backend: str):
+    """Choose how listing and detail pages are parsed: 'selectolax', 'lxml' or 'html.parser'."""
+    global PARSER_BACKEND, SOUP_PARSER
+    if backend == 'selectolax' and SelectolaxParser is None:
+        raise ValueError("selectolax is not installed")
+    if backend == 'lxml' and not LXML_AVAILABLE:
+        raise ValueError("lxml is not installed")
+    if backend not in ('selectolax', 'lxml', 'html.parser'):
+        raise ValueError(f"Unknown parser backend: {backend}")
+    PARSER_BACKEND = backend
+    if backend != 'selectolax':
+        SOUP_PARSER = backend
+    logging.info(f"Using {PARSER_BACKEND} to parse listing and detail pages")
+
+
+def make_soup(html: str) -> BeautifulSoup:
+    """Parse HTML with the fastest BeautifulSoup tree builder available."""
+    return BeautifulSoup(html, SOUP_PARSER)
+
+
+# Listing page markup, e.g. <article class="product-miniature"> and <nav class="pagination"><a class="next">
+PRODUCT_SELECTOR = 'article.product-miniature'
+NEXT_PAGE_SELECTOR = 'nav.pagination a.next'
+
+PRICE_PER_UNIT_PATTERN = re.compile(r'(\d+[,.]\d+)\s*€?\s*/\s*pcs')
+PACKAGING_PATTERN = re.compile(r'(\d+)\s*pcs\s*/\s*(carton|boite|box|paquet|pack|package)', re.IGNORECASE)
+
+
+def get_next_page_url(soup) -> str | None:
+    """Find the URL for the next page of products."""
+    next_page_link = soup.select_one(NEXT_PAGE_SELECTOR)
+    return next_page_link.get('href') if next_page_link else None
+
+
+def build_product(name: str, detail_url: str | None, price_text: str, short_desc: str) -> ProductRecord:
+    """Turn the raw text of a product container into a product record."""
+    price_per_carton = re.sub(r'[^\d,.]', '', price_text)  # price_per_carton - 13,20
+    price_per_unit_match = PRICE_PER_UNIT_PATTERN.search(short_desc)
+    packaging_match = PACKAGING_PATTERN.search(short_desc)
+    return ProductRecord(
+        name=name,
+        price_per_unit=price_per_unit_match.group(1) if price_per_unit_match else None,
+        price_per_carton=price_per_carton,
+        units_per_carton=packaging_match.group(1) if packaging_match else None,
+        packaging_type=packaging_match.group(2) if packaging_match else None,
+        detail_url=detail_url,
+        barcode=None # We will find this after using the detail_url link
+    )
+
+
+def extract_product_fields(container) -> ProductRecord:
+    """
+    Extract every listing field from a product container in one walk.
+
+    Equivalent to the original per-field extractors (the baseline in
+    benchmarks/bench_parse.py), but the container is traversed once and the
+    short description read once.
+    """
+    name_element = price_element = short_desc_element = None
+    for element in container.find_all(['a', 'span', 'p']):
+        classes = element.get('class') or ()
+        if name_element is None and element.name == 'a' and element.find_parent('h3', class_='product-title'):
+            name_element = element
+        elif price_element is None and element.name == 'span' and 'price' in classes \
+                and element.find_parent('div', class_='product-price-and-shipping'):
+            price_element = element
+        elif short_desc_element is None and element.name == 'p' and 'an_short_description' in classes:
+            short_desc_element = element
+        if name_element and price_element and short_desc_element:
+            break
+
+    return build_product(
+        name_element.get_text().strip() if name_element else "Unknown Product",
+        name_element.get('href') if name_element else None,
+        price_element.get_text().strip() if price_element else "0,00 €",
+        short_desc_element.get_text().strip() if short_desc_element else ""
+    )
+
+
+def extract_listing_products(soup) -> list[ProductRecord]:
+    """Extract the product records from a parsed listing page."""
+    products = []
+    for container in soup.select(PRODUCT_SELECTOR):
+        try:
+            products.append(extract_product_fields(container))
+        except Exception as e:
+            logging.error(f"Error extracting product data: {str(e)}")
+    return products
+
+
+def _node_text(node, default: str = "") -> str:
+    return node.text().strip() if node is not None else default
+
+
+def parse_listing_page(html: str) -> tuple[list[ProductRecord], str | None]:
+    """Parse a listing page into its products and the next page URL with the configured backend."""
+    if PARSER_BACKEND != 'selectolax':
+        with METRICS.timer('parse.listing'):
+            soup = make_soup(html)
+        with METRICS.timer('extract.listing'):
+            return extract_listing_products(soup), get_next_page_url(soup)
+
+    with METRICS.timer('parse.listing'):
+        tree = SelectolaxParser(html)
+    with METRICS.timer('extract.listing'):
+        return _extract_selectolax_listing(tree)
+
+
+def _extract_selectolax_listing(tree) -> tuple[list[ProductRecord], str | None]:
+    products = []
+    for container in tree.css(PRODUCT_SELECTOR):
+        try:
+            name_node = container.css_first('h3.product-title a')
+            products.append(build_product(
+                _node_text(name_node, "Unknown Product"),
+                name_node.attributes.get('href') if name_node is not None else None,
+                _node_text(container.css_first('div.product-price-and-shipping span.price'), "0,00 €"),
+                _node_text(container.css_first('p.an_short_description'))
+            ))
+        except Exception as e:
+            logging.error(f"Error extracting product data: {str(e)}")
+    next_page_link = tree.css_first(NEXT_PAGE_SELECTOR)
+    return products, next_page_link.attributes.get('href') if next_page_link is not None else None
+
+
+def resolve_links(hrefs: list[str], page_url: str) -> list[str]:
+    """Absolute URLs of a page's link hrefs, skipping #anchors and javascript: / mailto: / tel: links."""
+    links = []
+    for href in hrefs:
+        href = href.strip()  # href - /produits?page=2
+        if not href or href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+            continue
+        links.append(urljoin(page_url, href))
+    return links
+
+
+def parse_crawl_page(html: str, page_url: str) -> tuple[list[ProductRecord], str | None, list[str]]:
+    """
+    Parse any crawled page once into (listing products, next listing page URL, all links), as absolute URLs.
+
+    Pages without product containers give no products and no next page URL.
+    """
+    if PARSER_BACKEND != 'selectolax':
+        with METRICS.timer('parse.listing'):
+            soup = make_soup(html)
+        with METRICS.timer('extract.listing'):
+            products = extract_listing_products(soup) if soup.select_one(PRODUCT_SELECTOR) else []
+            next_url = get_next_page_url(soup) if products else None
+            hrefs = [anchor['href'] for anchor in soup.find_all('a', href=True)]
+    else:
+        with METRICS.timer('parse.listing'):
+            tree = SelectolaxParser(html)
+        with METRICS.timer('extract.listing'):
+            products, next_url = _extract_selectolax_listing(tree)
+            next_url = next_url if products else None
+            hrefs = [node.attributes.get('href') or '' for node in tree.css('a[href]')]
+
+    for product in products:
+        if product['detail_url']:
+            product['detail_url'] = urljoin(page_url, product['detail_url'])
+    return products, urljoin(page_url, next_url) if next_url else None, resolve_links(hrefs, page_url)
+
+
+def parse_barcode_candidates(html: str) -> list[tuple[str, str]]:
+    """Every (label, value) row of a detail page's data sheet, e.g. ('EAN13', '8445542003157')."""
+    soup = make_soup(html)
+    candidates = []
+    for value in soup.select('dd.value'):
+        label = value.find_previous_sibling('dt')
+        candidates.append((label.get_text().strip() if label else '', value.get_text().strip()))
+    return candidates
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _BarcodeParser(HTMLParser):
+    """Streaming parser that stops at the end of the first <dd class="value">."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_barcode = False
+        self.parts = []
+        self.barcode = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'dd' and not self.in_barcode and 'value' in (dict(attrs).get('class') or '').split():
+            self.in_barcode = True
+
+    def handle_data(self, data):
+        if self.in_barcode:
+            self.parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'dd' and self.in_barcode:
+            self.barcode = ''.join(self.parts).strip()
+            raise _StopParsing
+
+
+# Detail pages are fed to the streaming parser in chunks so parsing stops soon after the barcode
+BARCODE_PARSE_CHUNK = 16 * 1024
+
+
+def parse_barcode(html: str) -> str | None:
+    """Find the barcode on a detail page without building the full document tree."""
+    with METRICS.timer('parse.detail'):
+        return _parse_barcode(html)
+
+
+def _parse_barcode(html: str) -> str | None:
+    if PARSER_BACKEND == 'selectolax':
+        return _node_text(SelectolaxParser(html).css_first('dd.value')) or None
+
+    parser = _BarcodeParser()
+    try:
+        for start in range(0, len(html), BARCODE_PARSE_CHUNK):
+            parser.feed(html[start:start + BARCODE_PARSE_CHUNK])
+        parser.close()
+    except _StopParsing:
+        pass
+    return parser.barcode
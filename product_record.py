@@ -0,0 +1,123 @@
+"""Compact product record used from listing through barcode, translation and export."""
+import sys
+from collections.abc import Mapping, MutableMapping
+
+FIELDS = ('name', 'price_per_unit', 'price_per_carton', 'units_per_carton', 'packaging_type', 'detail_url', 'barcode')
+
+
+def parse_price(text) -> float | None:
+    """'13.20' or '13,20' -> 13.2; None, '' and unparsable text -> None."""
+    if text is None or text == '':
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def parse_units(text) -> int | None:
+    """'12' -> 12; None, '' and unparsable text -> None."""
+    if text is None or text == '':
+        return None
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _split_url(url: str | None) -> tuple[str | None, str | None, str | None]:
+    """
+    Split a detail URL into an interned directory, the slug, and an interned fragment,
+    e.g. https://pali.plus/produits/914-porte-manteau.html#/31-quantite-cartons ->
+         ('https://pali.plus/produits/', '914-porte-manteau.html', '#/31-quantite-cartons')
+    """
+    if url is None:
+        return None, None, None
+    url, hash_sign, fragment = url.partition('#')
+    directory, _, slug = url.rpartition('/')
+    return sys.intern(directory + '/') if directory else None, slug, sys.intern(hash_sign + fragment)
+
+
+class ProductRecord(MutableMapping):
+    """
+    One product, in about half the memory of the equivalent dict.
+
+    Fields live in __slots__ instead of a per-product hash table. Prices are
+    floats and units an int rather than strings. Packaging types are interned,
+    as are the directory and fragment of the detail URL, which every product
+    shares, so only the slug is stored per product. It still behaves like the
+    product dicts the rest of the scraper was written for: product['barcode'],
+    product.get('name'), dict(product) and json.dumps(..., default=dict) all work.
+    """
+
+    __slots__ = ('name', 'price_per_unit', 'price_per_carton', 'units_per_carton', '_packaging_type',
+                 '_url_directory', '_url_slug', '_url_fragment', 'barcode')
+
+    def __init__(self, name: str, price_per_unit=None, price_per_carton=None, units_per_carton=None,
+                 packaging_type: str | None = None, detail_url: str | None = None, barcode: str | None = None):
+        self.name = name
+        self.price_per_unit = parse_price(price_per_unit)
+        self.price_per_carton = parse_price(price_per_carton)
+        self.units_per_carton = parse_units(units_per_carton)
+        self.packaging_type = packaging_type
+        self.detail_url = detail_url
+        self.barcode = barcode
+
+    @classmethod
+    def from_mapping(cls, product: Mapping) -> 'ProductRecord':
+        """Build a record from a product dict, e.g. one loaded from a checkpoint or product_data.json."""
+        if isinstance(product, cls):
+            return product
+        return cls(**{field: product.get(field) for field in FIELDS})
+
+    @property
+    def packaging_type(self) -> str | None:
+        return self._packaging_type
+
+    @packaging_type.setter
+    def packaging_type(self, value: str | None):
+        self._packaging_type = sys.intern(value) if value is not None else None
+
+    @property
+    def detail_url(self) -> str | None:
+        if self._url_slug is None:
+            return None
+        return (self._url_directory or '') + self._url_slug + self._url_fragment
+
+    @detail_url.setter
+    def detail_url(self, value: str | None):
+        self._url_directory, self._url_slug, self._url_fragment = _split_url(value)
+
+    # Mapping interface, so records can stand in for the product dicts
+
+    def __getitem__(self, field: str):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field: str, value):
+        if field not in FIELDS:
+            raise KeyError(field)
+        if field in ('price_per_unit', 'price_per_carton'):
+            value = parse_price(value)
+        elif field == 'units_per_carton':
+            value = parse_units(value)
+        setattr(self, field, value)
+
+    def __delitem__(self, field: str):
+        raise TypeError("ProductRecord fields can't be deleted")
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"ProductRecord({dict(self)!r})"
+
+    def __reduce__(self):
+        # Pickle (e.g. for worker processes) as the constructor arguments
+        return self.__class__, tuple(getattr(self, field) for field in FIELDS)
@@ -0,0 +1,353 @@
+"""Rate limiting helpers shared by the scraper's fetch paths."""
+import logging
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from metrics import METRICS
+
+# Responses that mean the server wants us to slow down
+THROTTLE_STATUSES = {429, 502, 503, 504}
+
+# How often the adaptive limiter logs each host's current rate
+STATE_LOG_INTERVAL = 30.0
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token straight away (the balance may go negative) so
+            # concurrent callers queue up behind each other instead of racing.
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        """Block until a token is available and return the seconds spent waiting."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """Keep one token bucket per host so each site gets its own request budget."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc  # host - pali.plus
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return bucket
+
+    def reserve(self, url: str) -> float:
+        """Take a token for the host of `url` without blocking, return the seconds to wait."""
+        return self.bucket_for(url).reserve()
+
+    def acquire(self, url: str) -> float:
+        """Wait for the host of `url` to have budget left, return the seconds waited."""
+        return self.bucket_for(url).acquire()
+
+
+class SharedRateLimiter:
+    """
+    Per-host request budget shared by every process using the same SQLite file.
+
+    Each host has a next free slot time in the database; reserving takes that
+    slot and pushes it 1/rate seconds later, inside one write transaction, so
+    workers on other processes (or hosts sharing the file) queue up behind each
+    other. Wall-clock time is used because monotonic clocks differ per process.
+    """
+
+    def __init__(self, path: str, rate: float):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.path = path
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS rate_budget (host TEXT PRIMARY KEY, next_slot REAL NOT NULL)')
+
+    def reserve(self, url: str) -> float:
+        """Take the host's next slot and return how many seconds the caller must wait for it."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = self._conn.execute('SELECT next_slot FROM rate_budget WHERE host = ?', (host,)).fetchone()
+                slot = max(now, row[0]) if row else now
+                self._conn.execute(
+                    'INSERT INTO rate_budget (host, next_slot) VALUES (?, ?) '
+                    'ON CONFLICT(host) DO UPDATE SET next_slot = excluded.next_slot',
+                    (host, slot + 1 / self.rate)
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return slot - now
+
+    def acquire(self, url: str) -> float:
+        """Wait for the host of `url` to have budget left, return the seconds waited."""
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def close(self):
+        self._conn.close()
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, e.g. '30' or 'Wed, 21 Oct 2026 07:28:00 GMT'."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _HostState:
+    """Current rate, concurrency and latency estimate for one host."""
+
+    def __init__(self, rate: float, concurrency: float, max_rate: float):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.max_rate = max_rate
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.rate_bound = False  # True while callers are actually waiting on the rate
+        self.latency = None  # moving average of time to headers
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self.slow_start = True  # grow exponentially until the first sign of overload
+        self.last_logged = time.monotonic()
+        self.in_flight: set[threading.Thread] = set()
+        self.condition = threading.Condition()
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-host scheduler that finds the fastest rate a site tolerates, AIMD-style.
+
+    Every response is fed back through record() (attach() does this for a
+    requests.Session). While responses come back quickly the request rate
+    grows: by `slow_start` of itself per second until the site first pushes
+    back, then by `increase` requests/s per second; the number of concurrent
+    requests grows by about one per round of responses. A 429/503
+    response, a Retry-After header or latency climbing well above the best
+    seen halves both, at most once per cooldown. Retry-After also pauses the
+    host for as long as it asks. The rate stays between min_rate and
+    max_rate, and under the robots.txt crawl-delay once load_robots() ran.
+
+    acquire() and reserve() have the same meaning as HostRateLimiter's, so
+    the limiter works in every fetch path; acquire() also holds back threads
+    beyond the current concurrency. A thread's slot is freed by record(), or
+    by release() when its request never got a response.
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.05, max_rate: float = 5.0, max_concurrency: int = 1,
+                 slow_start: float = 0.5, increase: float = 0.5, decrease: float = 0.7, slow_factor: float = 4.0,
+                 cooldown: float = 2.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate  # the starting rate, for logging
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.slow_start = slow_start
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self._robots_max_rate: dict[str, float] = {}
+        self._hosts: dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url: str) -> tuple[str, _HostState]:
+        host = urlsplit(url).netloc  # host - pali.plus
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                max_rate = min(self.max_rate, self._robots_max_rate.get(host, self.max_rate))
+                state = self._hosts[host] = _HostState(min(self.rate, max_rate), self.max_concurrency, max_rate)
+            return host, state
+
+    def load_robots(self, session: requests.Session, base_url: str):
+        """Cap the host's rate with the Crawl-delay / Request-rate of its robots.txt, if it has one."""
+        host = urlsplit(base_url).netloc
+        try:
+            response = session.get(f"{base_url.rstrip('/')}/robots.txt", timeout=10)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Could not fetch robots.txt from {base_url}: {str(e)}")
+            return
+        if response.status_code != 200:
+            return
+        robots = RobotFileParser()
+        robots.parse(response.text.splitlines())
+        robots.modified()  # crawl_delay() answers None for a parser that never recorded a fetch
+        user_agent = session.headers.get('User-Agent', '*')
+        limits = []
+        crawl_delay = robots.crawl_delay(user_agent)
+        if crawl_delay:
+            limits.append(1 / float(crawl_delay))
+        request_rate = robots.request_rate(user_agent)
+        if request_rate and request_rate.requests:
+            limits.append(request_rate.requests / request_rate.seconds)
+        if limits:
+            self._robots_max_rate[host] = min(limits)
+            logging.info(f"robots.txt of {host} allows at most {min(limits):.2f} requests/s")
+
+    def attach(self, session: requests.Session) -> requests.Session:
+        """Feed every response the session receives back into the scheduler."""
+        def record_response(response, *args, **kwargs):
+            if not response.is_redirect:
+                self.record(response.url, response.elapsed.total_seconds(), response.status_code,
+                            response.headers.get('Retry-After'))
+        session.hooks['response'].append(record_response)
+        return session
+
+    def reserve(self, url: str) -> float:
+        """Take the host's next slot without blocking, return the seconds to wait for it."""
+        _, state = self._state(url)
+        with state.condition:
+            now = time.monotonic()
+            slot = max(now, state.next_slot, state.paused_until)
+            state.next_slot = slot + 1 / state.rate
+            state.rate_bound = slot > now
+            return slot - now
+
+    def try_reserve(self, url: str, waited: bool = False) -> float:
+        """
+        Take the host's next slot if it is due now and return 0, else return the seconds until it is, without booking it.
+
+        For callers that sleep and ask again, such as asyncio tasks, so a slot is
+        only booked just before its request is sent and rate increases apply
+        to every waiting caller. waited says the caller already slept for a slot.
+        """
+        _, state = self._state(url)
+        with state.condition:
+            now = time.monotonic()
+            slot = max(state.next_slot, state.paused_until)
+            if slot > now:
+                return slot - now
+            state.next_slot = now + 1 / state.rate
+            state.rate_bound = waited
+            return 0.0
+
+    def acquire(self, url: str) -> float:
+        """Wait for a concurrency slot and the host's next request slot, return the seconds waited."""
+        _, state = self._state(url)
+        started = time.monotonic()
+        thread = threading.current_thread()
+        with state.condition:
+            # A thread whose last request raised never got a response, so it may still be listed
+            state.in_flight = {other for other in state.in_flight if other.is_alive() and other is not thread}
+            while len(state.in_flight) >= int(state.concurrency):
+                state.condition.wait(timeout=0.5)
+                state.in_flight = {other for other in state.in_flight if other.is_alive()}
+            state.in_flight.add(thread)
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return time.monotonic() - started
+
+    def release(self, url: str):
+        """Free the calling thread's concurrency slot, e.g. after its request raised instead of getting a response."""
+        _, state = self._state(url)
+        with state.condition:
+            state.in_flight.discard(threading.current_thread())
+            state.condition.notify_all()
+
+    def record(self, url: str, latency: float, status: int, retry_after: str | None = None):
+        """Adjust the host's rate and concurrency after a response."""
+        host, state = self._state(url)
+        retry_seconds = parse_retry_after(retry_after)
+        with state.condition:
+            now = time.monotonic()
+            state.in_flight.discard(threading.current_thread())
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            state.best_latency = latency if state.best_latency is None else min(state.best_latency, latency)
+            slow = state.latency > self.slow_factor * max(state.best_latency, 0.05)
+
+            if status in THROTTLE_STATUSES or retry_seconds is not None or slow:
+                METRICS.inc('politeness.throttled')
+                if retry_seconds is not None:
+                    state.paused_until = max(state.paused_until, now + retry_seconds)
+                if now - state.last_decrease >= self.cooldown:
+                    # Responses to requests sent before the last decrease don't count against the new rate
+                    state.last_decrease = now
+                    state.slow_start = False
+                    old_rate = state.rate
+                    state.rate = max(self.min_rate, state.rate * self.decrease)
+                    state.concurrency = max(1.0, state.concurrency * self.decrease)
+                    reason = f"HTTP {status}" if status in THROTTLE_STATUSES else f"latency {state.latency:.2f}s"
+                    if retry_seconds is not None:
+                        reason += f", Retry-After {retry_seconds:.0f}s"
+                    logging.info(f"Slowing down {host}: {old_rate:.2f} -> {state.rate:.2f} requests/s, "
+                                 f"{int(state.concurrency)} concurrent ({reason})")
+            elif status < 500 and now >= state.paused_until:
+                # Only speed up while the rate is what holds requests back
+                if state.rate_bound:
+                    step = self.slow_start if state.slow_start else self.increase / state.rate
+                    state.rate = min(state.max_rate, state.rate + step)
+                state.concurrency = min(self.max_concurrency, state.concurrency + 1 / state.concurrency)
+            state.condition.notify_all()
+
+            METRICS.set_gauge('politeness.rate', state.rate)
+            METRICS.set_gauge('politeness.concurrency', int(state.concurrency))
+            if now - state.last_logged >= STATE_LOG_INTERVAL:
+                state.last_logged = now
+                logging.info(f"Politeness for {host}: {state.rate:.2f} requests/s, {int(state.concurrency)} "
+                             f"concurrent, latency {state.latency * 1000:.0f}ms")
+
+    def current_rate(self, url: str) -> float:
+        """The request rate the host is currently allowed."""
+        return self._state(url)[1].rate
+
+    def current_concurrency(self, url: str) -> int:
+        """The number of concurrent requests the host is currently allowed."""
+        return int(self._state(url)[1].concurrency)
+
+    def snapshot(self) -> dict[str, dict]:
+        """Current state per host, e.g. {'pali.plus': {'rate': 1.6, 'concurrency': 4, 'latency': 0.12, ...}}."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        now = time.monotonic()
+        return {
+            host: {'rate': state.rate, 'max_rate': state.max_rate, 'concurrency': int(state.concurrency),
+                   'in_flight': len(state.in_flight), 'latency': state.latency,
+                   'paused_for': max(0.0, state.paused_until - now)}
+            for host, state in hosts.items()
+        }
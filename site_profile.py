@@ -0,0 +1,171 @@
+"""Persisted site profile and cookie jar, so frequent runs can skip login and listing discovery."""
+import json
+import logging
+import os
+import time
+from http.cookiejar import LWPCookieJar
+
+import requests
+
+from fetching import (
+    discover_login,
+    find_login_links,
+    is_logged_in,
+    login_with_form,
+    new_session,
+)
+from parsing import NEXT_PAGE_SELECTOR, PRODUCT_SELECTOR, make_soup
+
+DEFAULT_PROFILE_PATH = '.site_profile.json'
+DEFAULT_COOKIE_PATH = '.site_cookies.txt'
+
+# Bump when the profile layout changes so old files are rediscovered instead of misread
+PROFILE_VERSION = 2
+
+
+def current_selectors() -> dict:
+    """The listing selectors this version of the scraper extracts with."""
+    return {'product': PRODUCT_SELECTOR, 'next_page': NEXT_PAGE_SELECTOR}
+
+
+def load_profile(path: str, base_url: str) -> dict | None:
+    """
+    Load a saved profile for base_url, e.g.
+    {'version': 2, 'base_url': 'https://pali.plus', 'discovered_at': 1760000000.0,
+     'login': {'url': 'https://pali.plus/connexion?back=my-account', 'form': {'action', 'method', 'inputs'}},
+     'listing_urls': {'llm': ['https://pali.plus/produits'], 'crawl': ['https://pali.plus/produits', ...]},
+     'selectors': {'product', 'next_page'}}
+    listing_urls is keyed by discovery mode: the listing the LLM picked, and the
+    first page of every listing a complete crawl found.
+    Returns None if there is no usable profile.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable site profile {path}: {str(e)}")
+        return None
+
+    if profile.get('version') != PROFILE_VERSION or profile.get('base_url') != base_url:
+        logging.info(f"Site profile {path} is for another site or version, rediscovering")
+        return None
+    if profile.get('selectors') != current_selectors():
+        # The scraper's selectors changed since the listing was picked, so it has to be checked again
+        profile['listing_urls'] = {}
+        profile['selectors'] = current_selectors()
+    return profile
+
+
+def save_profile(profile: dict, path: str):
+    """Write the profile atomically so an interrupted save never corrupts it."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_cookies(session: requests.Session, path: str) -> bool:
+    """Copy unexpired cookies from a saved jar into the session, return True if any were loaded."""
+    jar = LWPCookieJar(path)
+    try:
+        jar.load(ignore_discard=True)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logging.warning(f"Ignoring unreadable cookie jar {path}: {str(e)}")
+        return False
+
+    now = time.time()
+    for cookie in jar:
+        if not cookie.is_expired(now):
+            session.cookies.set_cookie(cookie)
+    return len(session.cookies) > 0
+
+
+def save_cookies(session: requests.Session, path: str):
+    """Save the session's cookies, including session cookies, readable only by the current user."""
+    jar = LWPCookieJar(path)
+    for cookie in session.cookies:
+        jar.set_cookie(cookie)
+    jar.save(ignore_discard=True)
+    os.chmod(path, 0o600)
+
+
+def _fetch_page(session: requests.Session, url: str) -> str | None:
+    try:
+        response = session.get(url)
+        response.raise_for_status()
+        return response.text
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Could not validate site profile at {url}: {str(e)}")
+        return None
+
+
+def validate_profile(session: requests.Session, profile: dict) -> bool:
+    """
+    Check the session is logged in, with one request to the saved listing page when there is one.
+
+    A saved listing that is gone or no longer has product elements is dropped
+    from the profile so it gets picked again.
+    """
+    saved = [(discovery, urls[0]) for discovery, urls in profile['listing_urls'].items() if urls]
+    if saved:
+        discovery, listing_url = saved[0]
+        html = _fetch_page(session, listing_url)
+        if html is not None:
+            if not is_logged_in(html):
+                return False
+            if make_soup(html).select_one(profile['selectors']['product']):
+                return True
+        logging.info(f"Saved listing {listing_url} no longer lists products, it will be rediscovered")
+        profile['listing_urls'][discovery] = []
+
+    html = _fetch_page(session, profile['base_url'])
+    return html is not None and is_logged_in(html)
+
+
+def open_session(base_url: str, email: str, password: str, profile_path: str = DEFAULT_PROFILE_PATH,
+                 cookie_path: str = DEFAULT_COOKIE_PATH,
+                 rediscover: bool = False) -> tuple[requests.Session | None, dict | None]:
+    """
+    Return a logged-in session and the site profile, doing as little work as the saved state allows.
+
+    1. Reuse the saved cookies if the site still shows us logged in.
+    2. Otherwise submit the saved login form directly.
+    3. Only if both fail, find the login links and form again and save a new profile.
+    """
+    profile = None if rediscover else load_profile(profile_path, base_url)
+
+    if profile:
+        session = new_session()
+        if load_cookies(session, cookie_path) and validate_profile(session, profile):
+            logging.info(f"Reusing saved session cookies from {cookie_path}")
+            save_profile(profile, profile_path)
+            return session, profile
+
+        session = new_session()
+        logging.info(f"Logging in with the saved form from {profile_path}")
+        try:
+            if login_with_form(session, profile['login']['form'], email, password) and validate_profile(session, profile):
+                save_profile(profile, profile_path)
+                save_cookies(session, cookie_path)
+                return session, profile
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Saved login form failed: {str(e)}")
+        logging.info("Saved site profile is stale, rediscovering the login form")
+
+    # Full discovery, as on a first run
+    session = new_session()
+    session, login = discover_login(find_login_links(base_url, session), email, password, session)
+    if session is None:
+        return None, None
+
+    listing_urls = profile['listing_urls'] if profile else {}
+    profile = {'version': PROFILE_VERSION, 'base_url': base_url, 'discovered_at': time.time(), 'login': login,
+               'listing_urls': listing_urls, 'selectors': current_selectors()}
+    save_profile(profile, profile_path)
+    save_cookies(session, cookie_path)
+    logging.info(f"Saved site profile to {profile_path}")
+    return session, profile
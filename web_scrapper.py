@@ -1,169 +1,44 @@
 import requests
-from bs4 import BeautifulSoup
 import logging
 from dotenv import load_dotenv
 import os
-from openai import OpenAI 
-import re
 import time
 import random
-import csv
-from french_to_english import translate_products_to_english
-
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-openai_api_key = os.getenv('OPENAI_API_KEY')
-openai_client = OpenAI(api_key=openai_api_key)
-
-def find_login_links(url: str):
-    """Find potential login links on the main page"""
-    try:
-        response = requests.get(url) 
-        soup = BeautifulSoup(response.text, 'html.parser') 
-        
-        # Look for common login link patterns
-        login_keywords = ['login', 'sign in', 'account', 'my account']
-        potential_links = []
-        
-        for link in soup.find_all('a'): # link - <a href="https://pali.plus/login">Login</a>
-            href = link.get('href', '').lower() # href - https://pali.plus/login
-            text = link.get_text().lower() # text - Login  
-            
-            if any(keyword in href or keyword in text for keyword in login_keywords):
-                potential_links.append({
-                    'text': link.get_text().strip(),
-                    'href': link.get('href')
-                })
-        
-        logging.info("Found potential login links:")
-        for link in potential_links:
-            if not link['href'].startswith('http'):
-                link['href'] = 'https:' + link['href']
-            logging.info(f"Text: {link['text']}, URL: {link['href']}")
-            
-        return potential_links
-        
-    except Exception as e:
-        logging.error(f"Error finding login links: {str(e)}")
-        return []
-
-def analyze_forms(soup):
-    """
-    Find all forms and their fields:
-        
-    e.g.
-    form - <form action="https://pali.plus/connexion" method="post">
-    input - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
-    """
-    forms_data = []
-    for form in soup.find_all('form'):
-        form_data = {
-            'action': form.get('action'), 
-            'method': form.get('method', 'GET'), 
-            'inputs': [] 
-        }
-        
-        # Get all input fields
-        for input_field in form.find_all('input'): # input_field - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
-            form_data['inputs'].append({
-                'name': input_field.get('name'),
-                'type': input_field.get('type'),
-                'value': input_field.get('value', '')
-            })
-        
-        forms_data.append(form_data) # form_data - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
-    
-    return forms_data
-
-def find_login_form(forms_data):
-    """Find the form that looks like a login form
-    
-    e.g.
-    form - <form action="https://pali.plus/connexion" method="post">
-    input - <input type="email" name="email" id="email" value="" placeholder="Email" class="form-control">
-    """
-    for form in forms_data: # form - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
-        has_email = False
-        has_password = False
-        
-        for input_field in form['inputs']: # input_field - {'name': 'email', 'type': 'email', 'value': ''}
-            if input_field['type'] in ['email', 'text'] and 'email' in input_field['name'].lower(): 
-                has_email = True
-            if input_field['type'] == 'password':
-                has_password = True
-        
-        if has_email and has_password: 
-            return form
-    
-    return None
-
-def attempt_login(potential_links: list[dict], email: str, password: str):
-    """Attempt to login using each potential login form, return session on success."""
-    session = requests.Session()
-    # Add browser-like headers, strongly preferring English
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',  # Strongly prefer English - Yeah hates me and doesn't work :(
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    })
-    
-    logging.info(f"Attempting to login with email: {email} and password: {password}")
-    logging.info(f"Potential links: {potential_links}")
-    """Attempt to login using each potential login form"""
-    for link in potential_links: # link - {'text': 'Login', 'href': 'https://pali.plus/connexion?back=my-account'}
-        logging.info(f"Attempting to login with link: {link}")
-        try:
-            login_url = link['href'] # login_url - https://pali.plus/connexion?back=my-account
-            response = session.get(login_url)  # Use session.get instead of requests.get
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Get all forms and their fields
-            forms_data = analyze_forms(soup) # forms_data - [{'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}]
-            login_form = find_login_form(forms_data) # login_form - {'action': 'https://pali.plus/connexion', 'method': 'POST', 'inputs': [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]}
-            
-            if login_form:
-                logging.info("Found login form!") 
-                logging.info(f"Form action: {login_form['action']}") # Form action: https://pali.plus/connexion
-                logging.info(f"Form method: {login_form['method']}") # Form method: POST
-                logging.info(f"Input fields: {login_form['inputs']}") # Input fields: [{'name': 'email', 'type': 'email', 'value': ''}, {'name': 'password', 'type': 'password', 'value': ''}]
-                
-                # Now we can prepare the login data
-                login_data = {} # login_data - {'email': 'test@test.com', 'password': 'our_password'}
-                for input_field in login_form['inputs']: # input_field - {'name': 'email', 'type': 'email', 'value': ''}
-                    if input_field['type'] in ['email', 'text'] and 'email' in input_field['name'].lower():
-                        login_data[input_field['name']] = email # login_data - {'email': 'test@test.com'}
-                    elif input_field['type'] == 'password':
-                        login_data[input_field['name']] = password # login_data - {'email': 'test@test.com', 'password': 'our_password'}
-                    elif input_field['type'] == 'hidden':
-                        login_data[input_field['name']] = input_field['value']
-                
-                # Submit the form
-                if login_form['method'].lower() == 'post':
-                    response = session.post(login_form['action'], data=login_data)
-                else:
-                    response = session.get(login_form['action'], params=login_data)
-                
-                # Check if login was successful
-                if 'logout' in response.text.lower() or 'my account' in response.text.lower():
-                    logging.info("Login successful!")
-                    return session  # Return the session object on success
-                else:
-                    # Log the form action URL correctly
-                    form_action = login_form['action']
-                    if form_action.startswith('//'):
-                        form_action = 'https:' + form_action
-                    logging.warning(f"Login submission to {form_action} seemed successful (status {response.status_code}) but couldn't confirm login.")
-            
-        except Exception as e:
-            logging.error(f"Error attempting login at {link['href']}: {str(e)}")
-    
-    logging.error("Failed to login using any of the potential links")
-    return None # Return None if login fails
+import argparse
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Iterator
+from urllib.parse import urljoin
+from french_to_english import DEFAULT_BATCH_SIZE, DEFAULT_TRANSLATE_WORKERS, PendingTranslations, get_openai_client, translate_product, translate_products_to_english, translation_cache
+from rate_limiter import AdaptiveRateLimiter, HostRateLimiter
+from http_cache import install_http_cache
+from incremental import diff_products, load_snapshot, merge_snapshot, save_snapshot, write_delta
+from checkpoint import CheckpointJournal, load_checkpoint
+from metrics import METRICS, instrument_session
+from exporters import FORMATS, MultiWriter, SqliteWriter, open_writer
+from product_record import ProductRecord
+import parsing
+from parsing import make_soup, parse_barcode_candidates, parse_listing_page, set_parser_backend
+from pagination import detect_page_pattern
+from parse_pool import run_parser, start_parse_pool, stop_parse_pool
+from barcodes import StreamingBarcodeCheck, apply_slug_barcodes, pick_barcode, slug_barcode, slug_barcodes, suspicious_rows, take_slug_barcode, validate_barcodes
+from fetching import DEFAULT_MAX_DEPTH, DEFAULT_REQUESTS_PER_SECOND, FetchStats, attempt_login, find_login_links, new_session, polite_get, scrape_single_barcode
+from frontier import crawl_site
+from async_backend import run_async_crawl
+from site_profile import open_session, save_profile
+from distributed import run_coordinator
+
+def set_parse_processes(processes: int):
+    """Parse listing pages in this many worker processes, or on the fetching threads with 0."""
+    if processes > 0:
+        start_parse_pool(processes, set_parser_backend, (parsing.PARSER_BACKEND,))
+    else:
+        stop_parse_pool()
 
 def find_next_level_urls(session, base_url):
     """
@@ -171,7 +46,7 @@ def find_next_level_urls(session, base_url):
     """
     try:
         response = session.get(base_url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.text)
 
         next_level_urls = set() # Use a set to automatically handle duplicates
 
@@ -244,7 +119,7 @@ def select_product_page_with_llm(url_list: list[str]) -> str | None:
     """
 
     try:
-        response = openai_client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4", 
             messages=[
                 {"role": "system", "content": "You are an expert web analyst helping identify specific page types from a list of URLs."},
@@ -262,97 +137,65 @@ def select_product_page_with_llm(url_list: list[str]) -> str | None:
         logging.error(f"Error calling OpenAI API: {str(e)}")
         return None
 
-def extract_product_name(container) -> tuple[str, str | None]:
-    """Extract product name and detail URL from container."""
-    name_element = container.select_one('h3.product-title a')
-    name = name_element.get_text().strip() if name_element else "Unknown Product"
-    detail_url = name_element.get('href') if name_element else None
-    return name, detail_url
-
-def extract_price_info(container) -> tuple[str, str | None]:
-    """Extract price per carton and price per unit from container."""
-    # Price per carton
-    price_element = container.select_one('div.product-price-and-shipping span.price')
-    price_per_carton_str = price_element.get_text().strip() if price_element else "0,00 €"
-    price_per_carton = re.sub(r'[^\d,.]', '', price_per_carton_str).replace(',', '.')
-    
-    # Price per unit
-    short_desc_element = container.select_one('p.an_short_description')
-    short_desc = short_desc_element.get_text().strip() if short_desc_element else ""
-    price_per_unit_match = re.search(r'(\d+[,.]\d+)\s*€?\s*/\s*pcs', short_desc)
-    price_per_unit = price_per_unit_match.group(1).replace(',', '.') if price_per_unit_match else None
-    
-    return price_per_carton, price_per_unit
-
-def extract_packaging_info(container) -> tuple[str | None, str | None]:
-    """Extract units per carton and packaging type from container."""
-    short_desc_element = container.select_one('p.an_short_description')
-    short_desc = short_desc_element.get_text().strip() if short_desc_element else ""
-    
-    packaging_match = re.search(r'(\d+)\s*pcs\s*/\s*(carton|boite|box|paquet|pack|package)', short_desc, re.IGNORECASE)
-    if packaging_match:
-        return packaging_match.group(1), packaging_match.group(2)
-    return None, None
-
-def get_next_page_url(soup) -> str | None:
-    """Find the URL for the next page of products."""
-    next_page_link = soup.select_one('nav.pagination a.next')
-    return next_page_link.get('href') if next_page_link else None
-
 def wait_between_requests():
     """Add a random delay between page requests."""
     delay = 2 + random.random()  # 2-3 seconds
-    logging.info(f"Waiting {delay:.2f} seconds before next request...")
+    logging.debug(f"Waiting {delay:.2f} seconds before next request...")
+    METRICS.observe('wait.sleep', delay)
     time.sleep(delay)
 
-def scrape_product_listings(session: requests.Session, start_url: str, max_pages: int = 999) -> list[dict]:
-    """Scrape all products from the listing pages, following pagination links."""
-    all_products = []
+def iter_product_listings(session: requests.Session, start_url: str, max_pages: int = 999,
+                          rate_limiter: HostRateLimiter | None = None, journal: CheckpointJournal | None = None,
+                          start_page: int = 0, prefetch: int = 0,
+                          status: dict | None = None) -> Iterator[ProductRecord]:
+    """
+    Yield products from the listing pages as each page is scraped, following pagination links.
+
+    With a journal, every completed page is checkpointed before its products are
+    yielded. start_page continues the page count of a resumed crawl. With
+    prefetch > 0 up to that many following pages are requested while the
+    current one is parsed, see iter_prefetched_listings. status, if given,
+    gets status['complete'] = True once the last listing page was scraped.
+    """
+    if prefetch > 0:
+        yield from iter_prefetched_listings(session, start_url, max_pages, rate_limiter, journal, start_page, prefetch,
+                                            status)
+        return
+
     current_url = start_url
-    page_count = 0
+    page_count = start_page
+    product_count = 0
     
     logging.info(f"Starting product listing scraping from {start_url}")
     
     while current_url and page_count < max_pages:
         page_count += 1
-        logging.info(f"Scraping listing page {page_count}: {current_url}")
+        logging.debug(f"Scraping listing page {page_count}: {current_url}")
         
         try:
             # Get the current page
-            response = session.get(current_url)
+            response, _ = polite_get(session, current_url, rate_limiter)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all product containers
-            product_containers = soup.select('article.product-miniature')
-            logging.info(f"Found {len(product_containers)} products on page {page_count}")
             
-            # Extract info from each product
-            for container in product_containers:
-                try:
-                    name, detail_url = extract_product_name(container)
-                    price_per_carton, price_per_unit = extract_price_info(container)
-                    units_per_carton, packaging_type = extract_packaging_info(container)
-                    
-                    product_data = {
-                        'name': name,
-                        'price_per_unit': price_per_unit,
-                        'price_per_carton': price_per_carton,
-                        'units_per_carton': units_per_carton,
-                        'packaging_type': packaging_type,
-                        'detail_url': detail_url,
-                        'barcode': None # We will find this after using the detail_url link
-                    }
-                    all_products.append(product_data)
-                except Exception as e:
-                    logging.error(f"Error extracting product data: {str(e)}")
+            # Extract info from each product container
+            products, next_url = run_parser(parse_listing_page, response)
+            logging.debug(f"Found {len(products)} products on page {page_count}")
+            METRICS.inc('listing.pages')
+            METRICS.inc('listing.products', len(products))
+            product_count += len(products)
+            if journal:
+                journal.record_page(current_url, next_url, page_count, products)
+            yield from products
             
             # Handle pagination
-            current_url = get_next_page_url(soup)
+            current_url = next_url
             if current_url:
-                wait_between_requests()
+                if rate_limiter is None:
+                    wait_between_requests()
             else:
                 logging.info("No next page link found. Reached the last page.")
+                if status is not None:
+                    status['complete'] = True
                 break
                 
         except requests.exceptions.RequestException as e:
@@ -362,78 +205,661 @@ def scrape_product_listings(session: requests.Session, start_url: str, max_pages
             logging.error(f"Error scraping listing page {current_url}: {str(e)}")
             break
     
-    logging.info(f"Completed scraping {len(all_products)} products from {page_count} pages")
-    return all_products
+    logging.info(f"Completed scraping {product_count} products from {page_count - start_page} pages")
 
-def scrape_product_barcode(session: requests.Session, all_products: list[dict]):
+def iter_prefetched_listings(session: requests.Session, start_url: str, max_pages: int = 999,
+                             rate_limiter: HostRateLimiter | None = None, journal: CheckpointJournal | None = None,
+                             start_page: int = 0, depth: int = 2,
+                             status: dict | None = None) -> Iterator[ProductRecord]:
     """
-    Scrape the barcode for each product from the detail page.
+    Like iter_product_listings, but fetch up to depth listing pages ahead.
+
+    Once the first two pages show how the page number appears in the URL
+    (e.g. ?page=N), the following pages are requested speculatively on a
+    thread pool while the current one is parsed, without going past the last
+    page linked from the pagination nav. A prefetched page is only used when
+    the previous page's next link points to it; otherwise the speculative
+    requests are dropped and pagination falls back to following the links.
     """
-    for product in all_products:
-        if product['detail_url']:
-            logging.info(f"Scraping barcode for {product['name']} from {product['detail_url']}")
+    if rate_limiter is None:
+        rate_limiter = HostRateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+    page_count = start_page
+    product_count = 0
+    pattern = None
+    pattern_broken = False
+    last_page = None
+
+    logging.info(f"Starting product listing scraping from {start_url}, prefetching {depth} pages ahead")
+
+    executor = ThreadPoolExecutor(max_workers=depth)
+    # ahead - (url, future) of the pages being fetched, in page order; the first is the next page to parse
+    ahead = deque([(start_url, executor.submit(polite_get, session, start_url, rate_limiter))])
+    try:
+        while ahead and page_count < max_pages:
+            current_url, future = ahead.popleft()
+            page_count += 1
+            logging.debug(f"Scraping listing page {page_count}: {current_url}")
+
             try:
-                response = session.get(product['detail_url'])
+                response, _ = future.result()
                 response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Directly find the barcode element
-                barcode_element = soup.find('dd', class_='value')
-                if barcode_element:
-                    barcode = barcode_element.get_text().strip()
-                    product['barcode'] = barcode
-                    logging.info(f"Found barcode for {product['name']}: {barcode}")
-                else:
-                    logging.warning(f"Barcode not found for {product['name']}")
+                products, next_url = run_parser(parse_listing_page, response)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Network error while scraping page {current_url}: {str(e)}")
+                break
             except Exception as e:
-                logging.error(f"Error scraping barcode for {product['name']}: {str(e)}")
-            
-            # Add a delay between requests
-            delay = 2 + random.random()  # 2-3 seconds
-            logging.info(f"Waiting {delay:.2f} seconds before next request...")
-            time.sleep(delay)
+                logging.error(f"Error scraping listing page {current_url}: {str(e)}")
+                break
+            next_url = urljoin(current_url, next_url) if next_url else None
+
+            logging.debug(f"Found {len(products)} products on page {page_count}")
+            METRICS.inc('listing.pages')
+            METRICS.inc('listing.products', len(products))
+            product_count += len(products)
+            if journal:
+                journal.record_page(current_url, next_url, page_count, products)
+
+            if ahead and ahead[0][0] != next_url:
+                # The next link isn't the page we guessed; drop the guesses and follow the links from here on
+                if next_url:
+                    logging.info(f"Pagination no longer follows {pattern}, following next links instead")
+                    pattern_broken = True
+                METRICS.inc('listing.prefetch_wasted', len(ahead))
+                for _, speculative in ahead:
+                    speculative.cancel()
+                ahead.clear()
+            if next_url and not ahead:
+                ahead.append((next_url, executor.submit(polite_get, session, next_url, rate_limiter)))
+            elif ahead:
+                METRICS.inc('listing.prefetch_hits')
+
+            if next_url and pattern is None and not pattern_broken:
+                pattern = detect_page_pattern(current_url, next_url)
+                if pattern:
+                    logging.debug(f"Listing pages follow {pattern}, prefetching")
+            if pattern and not pattern_broken:
+                # A nav that only links the next page says nothing about where the listing ends
+                linked_page = pattern.last_page(response.text, current_url)
+                if linked_page and linked_page > (pattern.page_of(next_url or '') or 0):
+                    last_page = max(last_page or 0, linked_page)
+                next_page = pattern.page_of(ahead[-1][0]) if ahead else None
+                while (next_page is not None and len(ahead) < depth and page_count + len(ahead) < max_pages
+                       and (last_page is None or next_page < last_page)):
+                    next_page += 1
+                    url = pattern.url_for(next_page)
+                    ahead.append((url, executor.submit(polite_get, session, url, rate_limiter)))
+
+            yield from products
+
+            if not next_url:
+                logging.info("No next page link found. Reached the last page.")
+                if status is not None:
+                    status['complete'] = True
+                break
+    finally:
+        # Pages fetched past the end, or past max_pages, are never parsed
+        if ahead:
+            METRICS.inc('listing.prefetch_wasted', len(ahead))
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logging.info(f"Completed scraping {product_count} products from {page_count - start_page} pages")
+
+def scrape_product_listings(session: requests.Session, start_url: str, max_pages: int = 999,
+                            prefetch: int = 0) -> list[ProductRecord]:
+    """Scrape all products from the listing pages, following pagination links."""
+    return list(iter_product_listings(session, start_url, max_pages, prefetch=prefetch))
+
+def fetch_detail_pages(function, products: list[dict], max_workers: int = 1,
+                       rate_limiter: HostRateLimiter | None = None) -> list:
+    """
+    Run function(product, rate_limiter) for each product, fetching detail pages politely.
 
-def save_products_to_csv(products: list[dict], filename: str):
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['name', 'price_per_unit', 'price_per_carton', 'units_per_carton', 'packaging_type', 'detail_url', 'barcode']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    With max_workers > 1 the products are handed to a thread pool and the
+    per-host rate limiter (DEFAULT_REQUESTS_PER_SECOND if none is given)
+    replaces the fixed 2-3 second sleep; a single worker also drops the sleep
+    when given a rate limiter. Returns the results in product order.
+    """
+    if max_workers > 1:
+        if rate_limiter is None:
+            rate_limiter = HostRateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the iterator so worker exceptions are not silently dropped
+            return list(executor.map(lambda product: function(product, rate_limiter), products))
+
+    results = []
+    for product in products:
+        results.append(function(product, rate_limiter))
+        if rate_limiter is None:
+            wait_between_requests()
+    return results
+
+def scrape_product_barcode(session: requests.Session, all_products: list[dict], max_workers: int = 1,
+                           rate_limiter: HostRateLimiter | None = None,
+                           journal: CheckpointJournal | None = None) -> FetchStats:
+    """
+    Scrape the barcode for each product from the detail page.
 
-        writer.writeheader()
-        for product in products:
-            writer.writerow(product)
+    The detail pages are fetched by fetch_detail_pages. Barcodes are
+    written onto the product dicts in place, so the list order is unchanged.
+    """
+    stats = FetchStats()
+    products = [product for product in all_products if product['detail_url']]
+
+    if max_workers > 1:
+        if rate_limiter is None:
+            rate_limiter = HostRateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+        logging.info(f"Scraping {len(products)} barcodes with {max_workers} workers at {rate_limiter.rate} requests/s per host")
+    fetch_detail_pages(lambda product, rate_limiter: scrape_single_barcode(session, product, rate_limiter, stats, journal),
+                       products, max_workers, rate_limiter)
+
+    summary = stats.summary()
+    logging.info(f"Barcode fetch stats: {summary['requests']} requests, {summary['errors']} errors, "
+                 f"p50 {summary['p50_latency']:.3f}s, p95 {summary['p95_latency']:.3f}s, "
+                 f"{summary['requests_per_second']:.2f} requests/s, {summary['rate_limit_wait']:.1f}s rate-limit wait")
+    return stats
+
+def refetch_barcode(session: requests.Session, product: dict, rate_limiter: HostRateLimiter | None = None) -> bool:
+    """Fetch a detail page again and take the data sheet row that holds a valid barcode, return whether one did."""
+    try:
+        response, _ = polite_get(session, product['detail_url'], rate_limiter)
+        response.raise_for_status()
+        with METRICS.timer('parse.detail'):
+            barcode = pick_barcode(parse_barcode_candidates(response.text))
+    except Exception as e:
+        METRICS.inc('barcodes.errors')
+        logging.error(f"Error re-fetching barcode for {product['name']}: {str(e)}")
+        return False
+    if barcode is None:
+        return False
+    if barcode != product['barcode']:
+        logging.debug(f"Re-fetched barcode for {product['name']}: {product['barcode']} -> {barcode}")
+        product['barcode'] = barcode
+        METRICS.inc('barcodes.repaired')
+    return True
+
+def check_barcodes(session: requests.Session, products: list[dict], rate_limiter: HostRateLimiter | None = None,
+                   refetch: bool = True, max_workers: int = 1) -> dict[str, list[int]]:
+    """
+    Validate the barcode column and repair the suspicious rows that can be repaired.
+
+    A suspicious row (missing, bad checksum, different from the slug, or shared
+    with another product) takes the barcode in its detail URL slug when that is
+    a valid GTIN. Otherwise, with refetch, its detail page is fetched again and
+    the data sheet searched for a valid, preferably EAN-labelled, barcode;
+    the re-fetches share max_workers and rate_limiter like the detail fetches.
+    Returns the row indexes still suspicious per problem, see validate_barcodes.
+    """
+    report = validate_barcodes(products)
+    suspicious = suspicious_rows(report)
+    logging.info(f"Barcode check: {len(suspicious)} of {len(products)} products suspicious ("
+                 + ', '.join(f"{len(rows)} {flag.replace('_', ' ')}" for flag, rows in report.items()) + ")")
+
+    refetch_queue = []
+    from_slug = 0
+    for i, slug in zip(suspicious, slug_barcodes([products[i]['detail_url'] for i in suspicious])):
+        if slug:
+            from_slug += products[i]['barcode'] != slug
+            products[i]['barcode'] = slug
+        elif products[i]['detail_url']:
+            refetch_queue.append(products[i])
+    METRICS.inc('barcodes.repaired', from_slug)
+
+    if refetch and refetch_queue:
+        logging.info(f"Took {from_slug} barcodes from detail URLs, re-fetching {len(refetch_queue)} detail pages")
+        fetch_detail_pages(lambda product, rate_limiter: refetch_barcode(session, product, rate_limiter),
+                           refetch_queue, max_workers, rate_limiter)
+
+    report = validate_barcodes(products)
+    remaining = suspicious_rows(report)
+    METRICS.inc('barcodes.suspicious', len(remaining))
+    if remaining:
+        logging.warning(f"{len(remaining)} products still have a suspicious barcode, e.g. "
+                        + ', '.join(f"{products[i]['name']} ({products[i]['barcode']})" for i in remaining[:5]))
+    return report
+
+def check_barcode(session: requests.Session, product: dict, barcode_check: StreamingBarcodeCheck,
+                  rate_limiter: HostRateLimiter | None = None, refetch: bool = True) -> list[str]:
+    """
+    Validate and repair one product's barcode the way check_barcodes does the whole column.
 
-def main():
+    Used where products stream through, e.g. run_pipeline; duplicates are only
+    found among the products checked before. Returns the problems left.
+    """
+    if barcode_check.problems(product):
+        slug = slug_barcode(product['detail_url'])
+        if slug:
+            if slug != product['barcode']:
+                product['barcode'] = slug
+                METRICS.inc('barcodes.repaired')
+        elif refetch and product['detail_url']:
+            refetch_barcode(session, product, rate_limiter)
+    problems = barcode_check.add(product)
+    if problems:
+        METRICS.inc('barcodes.suspicious')
+    return problems
+
+# Marks the end of a stage's output in run_pipeline
+_STAGE_DONE = object()
+
+def _close_stage_when_done(threads: list[threading.Thread], queue: Queue, consumers: int):
+    """Wait for a stage's threads, then tell every consumer of its output queue to stop."""
+    for thread in threads:
+        thread.join()
+    for _ in range(consumers):
+        queue.put(_STAGE_DONE)
+
+def run_pipeline(session: requests.Session, start_url: str | None, writer, max_pages: int = 999, max_workers: int = 4,
+                 translate_workers: int = 2, rate_limiter: HostRateLimiter | None = None,
+                 translate: bool = True, queue_size: int = 100, listings=None, prefetch: int = 0,
+                 use_slug_barcodes: bool = False, barcode_check: str = 'off') -> FetchStats:
+    """
+    Stream products through listing -> barcode -> translation -> writer.
+
+    Each stage runs in its own threads connected by bounded queues, so barcode
+    fetches start while pagination is still running and finished records are
+    written immediately. Records reach the writer in completion order.
+    listings replaces paginating from start_url, e.g. with a crawl_site() generator.
+    prefetch is the number of listing pages fetched ahead, see iter_prefetched_listings.
+    With use_slug_barcodes, products whose detail URL carries a valid GTIN skip the detail fetch.
+    barcode_check 'refetch' or 'report' validates each record in the barcode stage, see check_barcode.
+    """
+    if rate_limiter is None:
+        rate_limiter = HostRateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+    stats = FetchStats()
+    detail_queue = Queue(maxsize=queue_size)
+    translate_queue = Queue(maxsize=queue_size)
+    output_queue = Queue(maxsize=queue_size)
+
+    def produce_listings():
+        try:
+            if listings is None:
+                products = iter_product_listings(session, start_url, max_pages, rate_limiter=rate_limiter,
+                                                 prefetch=prefetch)
+            else:
+                products = listings
+            for product in products:
+                detail_queue.put(product)
+        finally:
+            for _ in range(max_workers):
+                detail_queue.put(_STAGE_DONE)
+
+    streaming_check = StreamingBarcodeCheck() if barcode_check != 'off' else None
+    suspicious = []
+
+    def fetch_details():
+        while (product := detail_queue.get()) is not _STAGE_DONE:
+            if product['detail_url'] and not (use_slug_barcodes and take_slug_barcode(product)):
+                scrape_single_barcode(session, product, rate_limiter, stats)
+            if streaming_check and check_barcode(session, product, streaming_check, rate_limiter,
+                                                 refetch=barcode_check == 'refetch'):
+                suspicious.append(product)
+            translate_queue.put(product)
+
+    # Translate threads wait for each other's requests rather than sending the same new string twice
+    pending_translations = PendingTranslations()
+
+    def translate_records():
+        while (product := translate_queue.get()) is not _STAGE_DONE:
+            output_queue.put(translate_product(product, pending=pending_translations) if translate else product)
+
+    listing_thread = threading.Thread(target=produce_listings, daemon=True)
+    detail_threads = [threading.Thread(target=fetch_details, daemon=True) for _ in range(max_workers)]
+    translate_threads = [threading.Thread(target=translate_records, daemon=True) for _ in range(translate_workers)]
+    for thread in [listing_thread, *detail_threads, *translate_threads]:
+        thread.start()
+    threading.Thread(target=_close_stage_when_done, args=(detail_threads, translate_queue, translate_workers), daemon=True).start()
+    threading.Thread(target=_close_stage_when_done, args=(translate_threads, output_queue, 1), daemon=True).start()
+
+    # The writer runs on the calling thread
+    while (product := output_queue.get()) is not _STAGE_DONE:
+        writer.write(product)
+
+    if translate:
+        translation_cache.save()
+        translation_cache.log_stats()
+    if suspicious:
+        logging.warning(f"{len(suspicious)} products have a suspicious barcode, e.g. "
+                        + ', '.join(f"{product['name']} ({product['barcode']})" for product in suspicious[:5]))
+    logging.info(f"Pipeline wrote {writer.count} products")
+    return stats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape product data from pali.plus")
+    parser.add_argument('--base-url', default='https://pali.plus',
+                        help="Site to scrape, e.g. a local benchmarks/fake_site.py server")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Maximum number of concurrent page fetches")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help="Requests per second per host: the starting rate with adaptive politeness, "
+                             "the fixed rate when --workers > 1 with --politeness fixed")
+    parser.add_argument('--politeness', choices=['adaptive', 'fixed'], default='adaptive',
+                        help="adaptive: speed up while the site answers quickly and back off on 429/503, "
+                             "Retry-After and rising latency, within the robots.txt crawl-delay; "
+                             "fixed: --rate, or a 2-3 s sleep between requests with one worker")
+    parser.add_argument('--max-rate', type=float, default=5.0,
+                        help="Adaptive politeness: never exceed this many requests per second per host")
+    parser.add_argument('--discover', choices=['crawl', 'llm'],
+                        help="How to find the products: crawl every listing page reachable from --base-url, or let "
+                             "the LLM pick one listing from the links on the home page (default: crawl, or llm "
+                             "with --async / --checkpoint, which follow a single listing)")
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH,
+                        help="Crawl discovery: links to follow from --base-url (pagination doesn't count)")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help="Request the next N listing pages while the current one is parsed, once the page "
+                             "number pattern of the pagination links (e.g. ?page=2) is known")
+    parser.add_argument('--site-profile', default='.site_profile.json', metavar='PATH',
+                        help="Where the login form and chosen product page are saved so later runs skip discovery")
+    parser.add_argument('--cookie-jar', default='.site_cookies.txt', metavar='PATH',
+                        help="Where session cookies are saved and reused while the site still accepts them")
+    parser.add_argument('--rediscover', action='store_true',
+                        help="Ignore the saved site profile and cookies and discover the login form again")
+    parser.add_argument('--no-site-profile', action='store_true',
+                        help="Neither read nor write the site profile and cookie jar")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Stream listing, barcode and translation stages concurrently instead of one after another")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Crawl listing and detail pages with the pooled aiohttp backend")
+    parser.add_argument('--distributed', type=int, metavar='N',
+                        help="Fetch listing and detail pages in N worker processes sharing a work queue and --rate")
+    parser.add_argument('--work-queue', default='crawl_queue.sqlite', metavar='PATH',
+                        help="Distributed mode: SQLite work queue; workers on other machines can join through it")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Distributed mode: split tasks into this many shards for external workers to claim")
+    parser.add_argument('--lease-seconds', type=float, default=120.0,
+                        help="Distributed mode: requeue a task when its worker hasn't finished it after this long")
+    parser.add_argument('--max-connections', type=int, default=100, help="Async backend: total connection pool size")
+    parser.add_argument('--max-per-host', type=int, default=10, help="Async backend: maximum connections per host")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Async backend: per-request timeout in seconds")
+    parser.add_argument('--retries', type=int, default=3, help="Async backend: retries on 429/5xx and network errors")
+    parser.add_argument('--http-cache', metavar='PATH',
+                        help="Cache listing and detail pages in this SQLite file and revalidate them on reruns")
+    parser.add_argument('--cache-max-mb', type=int, default=500, help="Size budget of the HTTP cache in MB")
+    parser.add_argument('--cache-ttl-days', type=float, default=30, help="Evict HTTP cache entries older than this")
+    parser.add_argument('--incremental', metavar='SNAPSHOT',
+                        help="Only fetch detail pages for products that are new or changed since this JSON snapshot "
+                             "(e.g. product_data.json), then refresh it")
+    parser.add_argument('--delta-output', default='product_delta.json',
+                        help="Where --incremental writes the added/changed/removed products")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="Journal crawl progress to this file so an interrupted run can be resumed")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from the last --checkpoint instead of starting over")
+    parser.add_argument('--no-slug-barcodes', dest='use_slug_barcodes', action='store_false',
+                        help="Fetch every detail page, even when the barcode is already in its URL "
+                             "(e.g. ...-8445542003157.html)")
+    parser.add_argument('--barcode-check', choices=['refetch', 'report', 'off'], default='refetch',
+                        help="After scraping, validate barcode checksums, compare them with the URL and look for "
+                             "duplicates; refetch: re-read the detail pages of suspicious rows, report: only log them")
+    parser.add_argument('--translate-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Unique strings packed into each translation request (0 sends one request per product)")
+    parser.add_argument('--translate-workers', type=int, default=DEFAULT_TRANSLATE_WORKERS,
+                        help="Concurrent translation requests")
+    parser.add_argument('--parser', choices=['selectolax', 'lxml', 'html.parser'],
+                        help=f"HTML parser for listing and detail pages (default: {parsing.PARSER_BACKEND})")
+    parser.add_argument('--parse-processes', type=int, default=0, metavar='N',
+                        help="Parse listing pages in N worker processes while threads keep fetching "
+                             "(0 parses on the fetching threads)")
+    parser.add_argument('--max-pages', type=int, default=1,
+                        help="Maximum number of listing pages to scrape (across all categories when crawling)")
+    parser.add_argument('--output', default='product_data.csv',
+                        help="File to write the products to; .csv, .jsonl, .parquet or .sqlite picks the format")
+    parser.add_argument('--format', choices=FORMATS, help="Output format, overriding the --output extension")
+    parser.add_argument('--sqlite-upsert', metavar='PATH',
+                        help="Also upsert the products into this SQLite database, keyed by product ID")
+    parser.add_argument('--metrics-out', metavar='PATH',
+                        help="Write run metrics to this file: JSON, or Prometheus text if it ends in .prom")
+    parser.add_argument('--profile', metavar='PATH', help="Profile the run with cProfile and dump the stats here")
+    parser.add_argument('--tracemalloc', action='store_true', help="Report peak memory and the top allocation sites")
+    args = parser.parse_args(argv)
+    if args.incremental and (args.pipeline or args.use_async):
+        parser.error("--incremental cannot be combined with --pipeline or --async")
+    if args.checkpoint and (args.pipeline or args.use_async):
+        parser.error("--checkpoint cannot be combined with --pipeline or --async")
+    if args.prefetch < 0:
+        parser.error("--prefetch must be 0 or more")
+    if args.parse_processes < 0:
+        parser.error("--parse-processes must be 0 or more")
+    if args.prefetch and (args.use_async or args.distributed):
+        parser.error("--prefetch cannot be combined with --async or --distributed")
+    if args.distributed and (args.pipeline or args.use_async or args.incremental or args.checkpoint):
+        parser.error("--distributed cannot be combined with --pipeline, --async, --incremental or --checkpoint")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint PATH")
+    if args.discover is None:
+        args.discover = 'llm' if args.use_async or args.checkpoint else 'crawl'
+    elif args.discover == 'crawl' and (args.use_async or args.checkpoint):
+        parser.error("--discover crawl cannot be combined with --async or --checkpoint")
+    return args
+
+def open_output(args):
+    """Open the --output writer, also upserting into the --sqlite-upsert database when given."""
+    writer = open_writer(args.output, args.format)
+    if args.sqlite_upsert:
+        return MultiWriter([writer, SqliteWriter(args.sqlite_upsert)])
+    return writer
+
+def build_rate_limiter(session: requests.Session, args) -> HostRateLimiter | AdaptiveRateLimiter:
+    """The request scheduler for this run, fed by the session's responses when it is adaptive."""
+    if args.politeness == 'fixed':
+        return HostRateLimiter(args.rate)
+    # Prefetched listing pages are requested alongside the current one
+    rate_limiter = AdaptiveRateLimiter(args.rate, max_rate=args.max_rate,
+                                       max_concurrency=max(args.workers, args.prefetch + 1, 1))
+    rate_limiter.load_robots(session, args.base_url)
+    rate_limiter.attach(session)
+    logging.info(f"Adaptive politeness: starting at {args.rate} requests/s per host, up to {rate_limiter.max_rate}")
+    return rate_limiter
+
+def crawl_listings(session: requests.Session, args, rate_limiter: HostRateLimiter | AdaptiveRateLimiter,
+                   status: dict | None = None, profile: dict | None = None):
+    """
+    Yield the products of every listing page reachable from --base-url.
+
+    With a site profile, the listings a previous complete crawl saved in it are
+    scraped directly instead of crawling the site for them again; otherwise a
+    complete crawl saves the listings it found for the next run.
+    """
+    status = {} if status is None else status
+    listing_urls = profile['listing_urls'].get('crawl') if profile else None
+    if listing_urls:
+        logging.info(f"Using the {len(listing_urls)} listings saved in {args.site_profile}")
+    yield from crawl_site(session, args.base_url, max_pages=args.max_pages, max_depth=args.max_depth,
+                          max_workers=max(args.workers, args.prefetch + 1, 1), rate_limiter=rate_limiter,
+                          prefetch=args.prefetch, status=status, listing_urls=listing_urls)
+
+    # A partial crawl may have missed whole categories, so only a complete one is worth saving
+    if profile and not listing_urls and status['complete'] and status['listing_urls']:
+        profile['listing_urls']['crawl'] = status['listing_urls']
+        save_profile(profile, args.site_profile)
+        logging.info(f"Saved {len(status['listing_urls'])} listings to {args.site_profile}")
+
+def scrape_products(session: requests.Session, product_page_url: str | None, args, resume_state: dict | None = None,
+                    profile: dict | None = None):
+    """
+    Scrape, translate and save the products reachable from the listing page.
+
+    Without a product_page_url, every listing page on the site is crawled,
+    or the listings saved in the site profile by an earlier crawl.
+    resume_state is a loaded checkpoint; when given, scraping continues from it
+    instead of starting at product_page_url.
+    """
+    # Distributed workers share a cross-process budget instead
+    rate_limiter = build_rate_limiter(session, args) if not args.distributed else None
+    # The fixed politeness of a single worker is the old 2-3 s sleep
+    sequential_limiter = rate_limiter if args.politeness == 'adaptive' else None
+
+    if args.pipeline:
+        listings = crawl_listings(session, args, rate_limiter, profile=profile) if product_page_url is None else None
+        with METRICS.timer('stage.pipeline'), open_output(args) as writer:
+            run_pipeline(session, product_page_url, writer, max_pages=args.max_pages,
+                         max_workers=max(args.workers, 1), translate_workers=args.translate_workers,
+                         rate_limiter=rate_limiter, listings=listings, prefetch=args.prefetch,
+                         use_slug_barcodes=args.use_slug_barcodes, barcode_check=args.barcode_check)
+        logging.info(f"Saved {writer.count} products to {writer.path}")
+        return
+
+    if args.distributed:
+        # When crawling, the coordinator discovers listings itself and queues their products for the workers
+        discover = None
+        if product_page_url is None:
+            discover = lambda rate_limiter: crawl_listings(session, args, rate_limiter, profile=profile)
+        with METRICS.timer('stage.crawl'):
+            products = run_coordinator(args.base_url, [product_page_url] if product_page_url else [], discover,
+                                       workers=args.distributed, rate=args.rate, max_pages=args.max_pages,
+                                       queue_path=args.work_queue, shards=args.shards,
+                                       lease_seconds=args.lease_seconds, use_slug_barcodes=args.use_slug_barcodes)
+    elif args.use_async:
+        with METRICS.timer('stage.crawl'):
+            products = run_async_crawl(session, product_page_url, max_pages=args.max_pages,
+                                       max_connections=args.max_connections, max_connections_per_host=args.max_per_host,
+                                       timeout=args.timeout, max_retries=args.retries,
+                                       rate_limiter=rate_limiter, use_slug_barcodes=args.use_slug_barcodes)
+    else:
+        journal = None
+        if args.checkpoint:
+            journal = CheckpointJournal(args.checkpoint, resume=resume_state is not None)
+
+        # Set to complete by the listing iterators once they scraped the last page
+        listing_status = {'complete': False}
+        with METRICS.timer('stage.listing'):
+            if resume_state:
+                # Continue pagination where the interrupted run stopped and reuse the barcodes it found
+                products = [ProductRecord.from_mapping(product) for product in resume_state['products']]
+                if resume_state['next_url']:
+                    products += iter_product_listings(session, resume_state['next_url'], max_pages=args.max_pages,
+                                                      rate_limiter=sequential_limiter, journal=journal,
+                                                      start_page=resume_state['page_count'], prefetch=args.prefetch,
+                                                      status=listing_status)
+                else:
+                    listing_status['complete'] = True
+                for product in products:
+                    product['barcode'] = resume_state['barcodes'].get(product['detail_url'], product['barcode'])
+            elif product_page_url is None:
+                products = list(crawl_listings(session, args, rate_limiter, listing_status, profile))
+            else:
+                if journal:
+                    journal.record_start(product_page_url)
+                # Scrape products from the listing pages
+                products = list(iter_product_listings(session, product_page_url, max_pages=args.max_pages,
+                                                      rate_limiter=sequential_limiter, journal=journal,
+                                                      prefetch=args.prefetch, status=listing_status))
+
+        # Only products that are new or changed since the last snapshot need their detail page
+        to_fetch = products
+        if args.incremental:
+            previous = load_snapshot(args.incremental)
+            delta = diff_products(products, previous, complete=listing_status['complete'])
+            to_fetch = delta['added'] + delta['changed']
+        if resume_state:
+            to_fetch = [product for product in to_fetch if product['detail_url'] not in resume_state['barcodes']]
+        if args.use_slug_barcodes:
+            to_fetch = apply_slug_barcodes(to_fetch)
+
+        # Scrape barcodes from detail pages
+        with METRICS.timer('stage.barcodes'):
+            scrape_product_barcode(session, to_fetch, max_workers=args.workers,
+                                   rate_limiter=rate_limiter if args.workers > 1 else sequential_limiter,
+                                   journal=journal)
+        if journal:
+            journal.close()
+
+    # Repair suspicious barcodes before they reach the snapshot and the output
+    if args.barcode_check != 'off':
+        refetch_limiter = rate_limiter if args.workers > 1 else sequential_limiter
+        if args.distributed:
+            refetch_limiter = HostRateLimiter(args.rate)
+        with METRICS.timer('stage.validation'):
+            check_barcodes(session, products, refetch_limiter, refetch=args.barcode_check == 'refetch',
+                           max_workers=args.distributed or args.workers)
+
+    if args.incremental:
+        write_delta(delta, args.delta_output)
+        if listing_status['complete']:
+            save_snapshot(products, args.incremental)
+        else:
+            # Products on pages this run didn't reach keep their snapshot rows
+            logging.info("The crawl stopped before the last listing page, merging it into the snapshot")
+            save_snapshot(merge_snapshot(products, previous), args.incremental)
+        logging.info(f"Wrote delta to {args.delta_output} and refreshed snapshot {args.incremental}")
+
+    # Translate products to English
+    with METRICS.timer('stage.translation'):
+        products = translate_products_to_english(products, batch_size=args.translate_batch_size or None,
+                                                 max_workers=args.translate_workers)
+
+    # Save products to the output file(s)
+    with METRICS.timer('stage.export'):
+        with open_output(args) as writer:
+            writer.write_many(products)
+    logging.info(f"Saved {writer.count} products to {writer.path}")
+
+def run(args):
+    """Log in, find the product listing and scrape it according to the parsed command line."""
+    if args.parser:
+        set_parser_backend(args.parser)
+    if args.parse_processes:
+        set_parse_processes(args.parse_processes)
     email = os.getenv('EMAIL')
     password = os.getenv('PASSWORD')
     
-    # First find login links and attempt login
-    potential_links = find_login_links('https://pali.plus')
-    session = attempt_login(potential_links, email, password)
+    # Reuse the saved session or login form when we can, otherwise find login links and attempt login
+    with METRICS.timer('stage.login'):
+        if args.no_site_profile:
+            profile = None
+            session = new_session()
+            potential_links = find_login_links(args.base_url, session)
+            session = attempt_login(potential_links, email, password, session)
+        else:
+            session, profile = open_session(args.base_url, email, password, args.site_profile, args.cookie_jar,
+                                            rediscover=args.rediscover)
 
     if session:
+        instrument_session(session)
+        if args.http_cache:
+            cache = install_http_cache(session, args.http_cache, max_bytes=args.cache_max_mb * 1024 * 1024,
+                                       ttl=args.cache_ttl_days * 24 * 3600)
+
+        if args.resume:
+            resume_state = load_checkpoint(args.checkpoint)
+            if resume_state:
+                logging.info(f"Resuming crawl from checkpoint {args.checkpoint}")
+                scrape_products(session, None, args, resume_state)
+                return
+            logging.warning(f"No checkpoint found at {args.checkpoint}, starting a fresh crawl")
+
+        if args.discover == 'crawl':
+            logging.info("Login successful, now crawling the site for listing pages...")
+            scrape_products(session, None, args, profile=profile)
+            if args.http_cache:
+                logging.info(f"HTTP cache: {cache.hits} pages revalidated (304), {cache.misses} downloaded")
+            return
+
+        if profile and profile['listing_urls'].get('llm'):
+            product_page_url = profile['listing_urls']['llm'][0]
+            logging.info(f"Using saved product page from {args.site_profile}: {product_page_url}")
+            scrape_products(session, product_page_url, args)
+            if args.http_cache:
+                logging.info(f"HTTP cache: {cache.hits} pages revalidated (304), {cache.misses} downloaded")
+            return
+
         logging.info("Login successful, now finding next level URLs...")
-        next_level_urls = find_next_level_urls(session, 'https://pali.plus')
+        with METRICS.timer('stage.discovery'):
+            next_level_urls = find_next_level_urls(session, args.base_url)
 
         if next_level_urls:
             # Select the product page from the list using LLM
-            product_page_url = select_product_page_with_llm(next_level_urls)
+            with METRICS.timer('stage.discovery'):
+                product_page_url = select_product_page_with_llm(next_level_urls)
+            if product_page_url and profile:
+                profile['listing_urls']['llm'] = [product_page_url]
+                save_profile(profile, args.site_profile)
 
             if product_page_url:
                 logging.info(f"Proceeding with product page: {product_page_url}")
                 
-                # Scrape products from the listing pages
-                products = scrape_product_listings(session, product_page_url, max_pages=1)
-                
-                # Scrape barcodes from detail pages
-                scrape_product_barcode(session, products)
-                
-                # Translate products to English
-                products = translate_products_to_english(products)
-                
-                # Save products to CSV
-                save_products_to_csv(products, 'product_data.csv')
-                logging.info(f"Saved {len(products)} products to product_data.csv")
-                
+                scrape_products(session, product_page_url, args)
+                if args.http_cache:
+                    logging.info(f"HTTP cache: {cache.hits} pages revalidated (304), {cache.misses} downloaded")
             else:
                 logging.error("Could not determine the product page URL using LLM.")
         else:
@@ -441,5 +867,36 @@ def main():
     else:
         logging.error("Login failed, cannot proceed")
 
+def main(argv=None):
+    # Only the script loads .env and configures logging, so importing it (e.g. in spawned workers) has no side effects
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    args = parse_args(argv)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    try:
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(run, args)
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+            logging.info(f"Wrote profile to {args.profile} (view with `python -m pstats {args.profile}`)")
+        else:
+            run(args)
+    finally:
+        set_parse_processes(0)
+
+    METRICS.log_summary()
+    if args.metrics_out:
+        METRICS.write(args.metrics_out)
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        logging.info(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB, top allocation sites:")
+        for stat in tracemalloc.take_snapshot().statistics('lineno')[:10]:
+            logging.info(f"  {stat}")
+        tracemalloc.stop()
+
 if __name__ == "__main__":
     main()
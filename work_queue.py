@@ -0,0 +1,181 @@
+"""SQLite-backed work queue with leases, used by the coordinator/worker crawl mode."""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+from incremental import product_id_from_url
+
+# Listing tasks go first so detail work is discovered as early as possible
+KIND_PRIORITY = {'listing': 0, 'detail': 1}
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def task_key(kind: str, url: str) -> str:
+    """Dedup key: detail tasks by product ID so a product listed twice is fetched once, listings by URL."""
+    if kind == 'detail':
+        return f"detail:{product_id_from_url(url) or url}"
+    return f"{kind}:{url}"
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Stable shard number for a task key, e.g. to give each node its own slice of products."""
+    return zlib.crc32(key.encode('utf-8')) % shards
+
+
+class WorkQueue:
+    """
+    Durable queue of crawl tasks shared by worker processes through one SQLite file.
+
+    A worker leases a task for lease_seconds and then completes or fails it.
+    Leases that run out (the worker died or hung) go back to the queue on the
+    next lease() call, and release_owner() requeues a dead worker's leases at once.
+    Task statuses: queued -> leased -> done | failed.
+
+    Settings every process must agree on (shard count, request rate) live in
+    the meta table; the coordinator writes them and workers read them.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, kind TEXT NOT NULL, url TEXT NOT NULL, '
+            'payload TEXT, shard INTEGER NOT NULL, priority INTEGER NOT NULL, status TEXT NOT NULL DEFAULT \'queued\', '
+            'attempts INTEGER NOT NULL DEFAULT 0, lease_owner TEXT, lease_expires REAL, result TEXT, error TEXT)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, priority, shard, id)')
+
+    def set_meta(self, key: str, value):
+        self._transaction(lambda conn: conn.execute(
+            'INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, json.dumps(value))))
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @property
+    def shards(self) -> int:
+        return self.get_meta('shards', 1)
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside one write transaction, so concurrent processes see it atomically."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._conn)
+                self._conn.execute('COMMIT')
+                return result
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def put_many(self, kind: str, items: list[tuple[str, dict]]) -> int:
+        """Queue (url, payload) tasks, skipping ones already known; return how many were new."""
+        rows = []
+        shards = self.shards
+        for url, payload in items:
+            key = task_key(kind, url)
+            rows.append((key, kind, url, json.dumps(payload, ensure_ascii=False, default=dict), shard_for(key, shards),
+                         KIND_PRIORITY[kind]))
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO tasks (key, kind, url, payload, shard, priority) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def put(self, kind: str, url: str, payload: dict) -> bool:
+        return self.put_many(kind, [(url, payload)]) == 1
+
+    def lease(self, owner: str, shards: list[int] | None = None) -> dict | None:
+        """
+        Lease the next task, e.g. {'id', 'kind', 'url', 'payload', 'attempts'}, or None if nothing is queued.
+
+        With shards, only tasks in those shards are handed out.
+        """
+        def take(conn):
+            now = time.time()
+            self._requeue_expired(conn, now)
+            query = 'SELECT id, kind, url, payload, attempts FROM tasks WHERE status = \'queued\''
+            params = []
+            if shards is not None:
+                query += f" AND shard IN ({', '.join('?' for _ in shards)})"
+                params += shards
+            row = conn.execute(query + ' ORDER BY priority, id LIMIT 1', params).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE tasks SET status = \'leased\', lease_owner = ?, lease_expires = ?, '
+                         'attempts = attempts + 1 WHERE id = ?', (owner, now + self.lease_seconds, row[0]))
+            return {'id': row[0], 'kind': row[1], 'url': row[2], 'payload': json.loads(row[3]), 'attempts': row[4] + 1}
+        return self._transaction(take)
+
+    def _requeue_expired(self, conn, now: float):
+        requeued = conn.execute('UPDATE tasks SET status = \'queued\', lease_owner = NULL '
+                                'WHERE status = \'leased\' AND lease_expires < ? AND attempts < ?',
+                                (now, self.max_attempts)).rowcount
+        failed = conn.execute('UPDATE tasks SET status = \'failed\', error = \'lease expired\' '
+                              'WHERE status = \'leased\' AND lease_expires < ?', (now,)).rowcount
+        if requeued or failed:
+            logging.warning(f"Requeued {requeued} expired leases, gave up on {failed} tasks")
+
+    def release_owner(self, owner: str) -> int:
+        """Requeue every task leased by a worker that is known to be dead."""
+        return self._transaction(lambda conn: conn.execute(
+            'UPDATE tasks SET status = \'queued\', lease_owner = NULL WHERE status = \'leased\' AND lease_owner = ?',
+            (owner,)).rowcount)
+
+    def complete(self, task_id: int, owner: str, result: dict | None = None) -> bool:
+        """Mark a leased task done; returns False if the lease was lost to another worker meanwhile."""
+        return self._transaction(lambda conn: conn.execute(
+            'UPDATE tasks SET status = \'done\', result = ?, lease_owner = NULL '
+            'WHERE id = ? AND lease_owner = ? AND status = \'leased\'',
+            (json.dumps(result, ensure_ascii=False, default=dict) if result is not None else None, task_id,
+             owner)).rowcount == 1)
+
+    def fail(self, task_id: int, owner: str, error: str) -> bool:
+        """Give a failed task back to the queue, or mark it failed once it used up its attempts."""
+        return self._transaction(lambda conn: conn.execute(
+            'UPDATE tasks SET status = CASE WHEN attempts < ? THEN \'queued\' ELSE \'failed\' END, '
+            'error = ?, lease_owner = NULL WHERE id = ? AND lease_owner = ? AND status = \'leased\'',
+            (self.max_attempts, error, task_id, owner)).rowcount == 1)
+
+    def counts(self) -> dict[str, int]:
+        """Number of tasks per status, e.g. {'queued': 10, 'leased': 4, 'done': 120}."""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall()
+        return dict(rows)
+
+    def close_input(self):
+        """Tell workers the coordinator has queued everything it is going to."""
+        self.set_meta('input_closed', True)
+
+    def is_drained(self) -> bool:
+        """True once the input is closed and nothing is queued or leased, so no more tasks can appear."""
+        counts = self.counts()
+        return self.get_meta('input_closed', False) and not counts.get('queued') and not counts.get('leased')
+
+    def iter_results(self, kind: str = 'detail'):
+        """Yield the results of finished tasks (and the payloads of failed ones) in the order they were queued."""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, payload, result FROM tasks WHERE kind = ? '
+                                      'AND status IN (\'done\', \'failed\') ORDER BY id', (kind,)).fetchall()
+        for status, payload, result in rows:
+            yield json.loads(result if status == 'done' and result else payload)
+
+    def close(self):
+        self._conn.close()